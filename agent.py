@@ -7,7 +7,8 @@ Scope:
 - NMS discovery: via config.get_nms_base() (failover + caching).
 - Poll: GET /cmd/poll/{scanner}
 - Execute: scan.start / scan.stop / scan.once / bundle.apply
-- Ack: POST /cmd/ack/{scanner}
+  (one worker thread behind a bounded queue; polling never waits on a command)
+- Ack: POST /cmd/ack/{scanner}  (or /cmd/ack_batch/{scanner} for several at once)
 - Bundle telemetry: POST /bootstrap/report/{scanner}  (installed_version only)
 
 Notes:
@@ -18,15 +19,29 @@ Notes:
 import os
 import time
 import json
+import logging
+import logging.handlers
+import queue
+import random
 import subprocess
 import signal
-from typing import Any, Dict, Tuple, List
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, List
 from pathlib import Path
 from config import (
     BASE_DIR,
     get_nms_base,
+    invalidate_nms_cache,
+    HTTP_SESSION,
+    close_nms_session,
     SCANNER_NAME_FILE,
     local_ts,
+    run_systemctl,
+    systemctl_prefix,
+    SERVICE_SCANNER_POLLER,
 
     # AV single source of truth
     AV_DIR,
@@ -39,14 +54,12 @@ from config import (
     AV_DEFAULT_AUDIO_DEV,
     AV_DEFAULT_SIZE,
     AV_DEFAULT_FPS,
-    BASE_DIR,
-    get_nms_base,
-    SCANNER_NAME_FILE,
-    local_ts,
-)
-from config import SYSTEMCTL, SUDO, SERVICE_SCANNER_POLLER, SERVICE_AVSTREAM
-from config import (
-    MPV_BIN, AUDIO_AO_DEFAULT, AUDIO_DEVICE_DEFAULT, AUDIO_VOLUME_DEFAULT,
+
+    # Audio playback
+    MPV_BIN,
+    AUDIO_AO_DEFAULT,
+    AUDIO_DEVICE_DEFAULT,
+    AUDIO_VOLUME_DEFAULT,
 )
 import requests
 from bundle_manager import apply_bundle
@@ -60,21 +73,60 @@ from voice.voice_agent_api import (
 
 REGISTER_PY = BASE_DIR / "register.py"
 LOG_PATH = BASE_DIR / "agent.log"
+LOG_MAX_BYTES = int(os.getenv("AGENT_LOG_MAX_BYTES", str(512 * 1024)))
+LOG_BACKUPS = int(os.getenv("AGENT_LOG_BACKUPS", "3"))
 SCAN_SCRIPT = str(BASE_DIR / "scan_wifi.sh")
 
 # Runtime tuning
 POLL_INTERVAL_SEC = int(os.getenv("POLL_INTERVAL_SEC", "5"))
 POLL_LIMIT = int(os.getenv("POLL_LIMIT", "10"))
+# Long-poll: ask NMS to hold /cmd/poll up to this many seconds (0 = short poll)
+POLL_WAIT_SEC = int(os.getenv("POLL_WAIT_SEC", "0"))
 HTTP_TIMEOUT_SEC = int(os.getenv("HTTP_TIMEOUT_SEC", "10"))
 REGISTER_RETRY_SEC = int(os.getenv("REGISTER_RETRY_SEC", "10"))
 OFFLINE_RETRY_SEC = int(os.getenv("OFFLINE_RETRY_SEC", "5"))
+CMD_QUEUE_MAX = int(os.getenv("CMD_QUEUE_MAX", "8"))
+BACKOFF_MAX_SEC = int(os.getenv("BACKOFF_MAX_SEC", "60"))
+# LAN-only opt-in: NMS replies are tiny JSON there, gzip costs more CPU than it saves.
+# Sent per request on poll/ack/report only, never set on the shared session.
+HTTP_ACCEPT_IDENTITY = os.getenv("HTTP_ACCEPT_IDENTITY", "0") == "1"
+
+# Optional fast JSON codec (falls back to stdlib)
+try:
+    import orjson  # type: ignore
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    # compact like orjson; encoder built once instead of per dumps() call
+    _JSON_ENCODE = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    def _json_dumps(obj: Any) -> bytes:
+        return _JSON_ENCODE(obj).encode("utf-8")
+
+_POLL_HEADERS = {"Accept-Encoding": "identity"} if HTTP_ACCEPT_IDENTITY else {}
+_JSON_HEADERS = {"Content-Type": "application/json", **_POLL_HEADERS}
+
+# Optional: inotify tells us when scanner_name.txt is rewritten (e.g. by the GUI
+# running register.py); without it the cache is only dropped after our own
+# registration attempt.
+try:
+    from inotify_simple import INotify, flags as _in_flags  # type: ignore
+except Exception:
+    INotify = None
+
+# Command parsing / policy
+_ALLOWED_CATS = frozenset({"scan", "av", "voice"})
+
+# One shared keep-alive session for all NMS traffic (poll / ack / report),
+# the same pool config.py uses for /health. No urllib3-level retries:
+# the poll loop itself is the retry.
+SESSION = HTTP_SESSION
 
 # Audio/TTS
 AUDIO_PID_FILE = "/tmp/scanner_audio_play.pid"
 TTS_SCRIPT = str(BASE_DIR / "av" / "tts_say.sh")
 
 # Voice (Wave-2)
-from pathlib import Path
 VOICE_DIR = BASE_DIR / "voice"
 VOICE_CFG_FILE = VOICE_DIR / "voice_config.json"
 SERVICE_VOICE = "scanner-voice.service"
@@ -83,23 +135,106 @@ from voice.voice_common import (
     load_voice_config,
     update_voice_config,
     validate_script,
+    voice_config_transaction,
 )
 
 
-def log(msg: str) -> None:
-    line = f"[{local_ts()}] {msg}"
-    print(line, flush=True)
+_LOGGER = logging.getLogger("agent")
+
+def _setup_logging() -> None:
+    """
+    One long-lived fd for agent.log (size-bounded, rotated) + stdout for journald.
+    Replaces open/append/close per line, which hammered SD-card metadata.
+    """
+    if _LOGGER.handlers:
+        return
+    fmt = logging.Formatter("%(message)s")
     try:
-        with LOG_PATH.open("a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        fh = logging.handlers.RotatingFileHandler(
+            LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+            encoding="utf-8", delay=True,
+        )
+        fh.setFormatter(fmt)
+        _LOGGER.addHandler(fh)
     except Exception:
         pass
+    sh = logging.StreamHandler(sys.stdout)
+    sh.setFormatter(fmt)
+    _LOGGER.addHandler(sh)
+    _LOGGER.setLevel(logging.INFO)
+    _LOGGER.propagate = False
+
+def log(msg: str) -> None:
+    if not _LOGGER.handlers:
+        _setup_logging()
+    _LOGGER.info(f"[{local_ts()}] {msg}")
+
+@dataclass(frozen=True)
+class Endpoints:
+    """
+    NMS URLs for one (nms_base, scanner) identity.
+    Built once in main() and rebuilt only when either side changes.
+    """
+    base: str
+    scanner: str
+    poll: str
+    ack: str
+    ack_batch: str
+    report: str
+
+def build_endpoints(nms_base: str, scanner: str) -> Endpoints:
+    return Endpoints(
+        base=nms_base,
+        scanner=scanner,
+        poll=f"{nms_base}/cmd/poll/{scanner}",
+        ack=f"{nms_base}/cmd/ack/{scanner}",
+        ack_batch=f"{nms_base}/cmd/ack_batch/{scanner}",
+        report=f"{nms_base}/bootstrap/report/{scanner}",
+    )
+
+_SCANNER_NAME_CACHE = ""  # "" = not cached
+_NAME_WATCH = None
+
+def _init_name_watch() -> None:
+    global _NAME_WATCH
+    if INotify is None or _NAME_WATCH is not None:
+        return
+    try:
+        w = INotify(nonblocking=True)
+        w.add_watch(str(SCANNER_NAME_FILE.parent),
+                    _in_flags.CLOSE_WRITE | _in_flags.MOVED_TO | _in_flags.DELETE)
+        _NAME_WATCH = w
+    except Exception:
+        _NAME_WATCH = None
+
+def _name_file_changed() -> bool:
+    if _NAME_WATCH is None:
+        return False
+    try:
+        return any(ev.name == SCANNER_NAME_FILE.name for ev in _NAME_WATCH.read(timeout=0))
+    except Exception:
+        return False
+
+def invalidate_scanner_name() -> None:
+    global _SCANNER_NAME_CACHE
+    _SCANNER_NAME_CACHE = ""
 
 def read_scanner_name() -> str:
+    """
+    scanner_name.txt only changes on (re-)registration, so keep it in memory.
+    An empty result is never cached (we keep retrying registration).
+    """
+    global _SCANNER_NAME_CACHE
+    if _name_file_changed():
+        _SCANNER_NAME_CACHE = ""
+    if _SCANNER_NAME_CACHE:
+        return _SCANNER_NAME_CACHE
     try:
-        return SCANNER_NAME_FILE.read_text(encoding="utf-8").strip()
+        name = SCANNER_NAME_FILE.read_text(encoding="utf-8").strip()
     except Exception:
         return ""
+    _SCANNER_NAME_CACHE = name
+    return name
 
 def run_register_once() -> None:
     """Best-effort registration attempt. Never raise."""
@@ -114,37 +249,15 @@ def run_register_once() -> None:
         )
     except Exception:
         pass
-
-def _run_systemctl(args: List[str]) -> Tuple[bool, str, str]:
-    """Run systemctl. Try without sudo first; if that fails, retry with sudo -n."""
-    try:
-        cp = subprocess.run(
-            [SYSTEMCTL] + args,
-            check=True,
-            capture_output=True,
-            text=True,
-            stdin=subprocess.DEVNULL,
-        )
-        return True, (cp.stdout or "").strip(), (cp.stderr or "").strip()
-    except subprocess.CalledProcessError as e1:
-        try:
-            cp2 = subprocess.run(
-                [SUDO, "-n", SYSTEMCTL] + args,
-                check=True,
-                capture_output=True,
-                text=True,
-                stdin=subprocess.DEVNULL,
-            )
-            return True, (cp2.stdout or "").strip(), (cp2.stderr or "").strip()
-        except subprocess.CalledProcessError as e2:
-            return False, (e2.stdout or "").strip(), (e2.stderr or e1.stderr or "").strip()
+    finally:
+        invalidate_scanner_name()
 
 def exec_scan_start() -> Tuple[bool, str]:
-    ok, out, err = _run_systemctl(["start", SERVICE_SCANNER_POLLER])
+    ok, out, err = run_systemctl(["start", SERVICE_SCANNER_POLLER])
     return (True, "started scanner-poller.service") if ok else (False, f"start failed: {err or out}")
 
 def exec_scan_stop() -> Tuple[bool, str]:
-    ok, out, err = _run_systemctl(["stop", SERVICE_SCANNER_POLLER])
+    ok, out, err = run_systemctl(["stop", SERVICE_SCANNER_POLLER])
     return (True, "stopped scanner-poller.service") if ok else (False, f"stop failed: {err or out}")
 
 def exec_scan_once() -> Tuple[bool, str]:
@@ -164,44 +277,94 @@ def exec_scan_once() -> Tuple[bool, str]:
     except Exception as e:
         return False, f"scan_once exception: {type(e).__name__}: {e}"
 
-def fetch_commands(nms_base: str, scanner: str) -> Tuple[bool, Dict[str, Any]]:
-    """Returns (ok, payload). ok=False means network/parse error."""
-    url = f"{nms_base}/cmd/poll/{scanner}"
+def fetch_commands(ep: Endpoints) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Returns (ok, payload). ok=False means network/parse error.
+
+    With POLL_WAIT_SEC > 0 the NMS may hold the request until a command is
+    queued; connect timeout stays short, read timeout covers the hold, and a
+    read timeout is treated as an empty poll.
+    """
+    params: Dict[str, Any] = {"limit": POLL_LIMIT}
+    timeout: Any = HTTP_TIMEOUT_SEC
+    if POLL_WAIT_SEC > 0:
+        params["wait"] = POLL_WAIT_SEC
+        timeout = (HTTP_TIMEOUT_SEC, POLL_WAIT_SEC + HTTP_TIMEOUT_SEC)
     try:
-        r = requests.get(url, params={"limit": POLL_LIMIT}, timeout=HTTP_TIMEOUT_SEC)
+        r = SESSION.get(ep.poll, params=params, headers=_POLL_HEADERS, timeout=timeout, stream=False)
         if r.status_code != 200:
             return False, {"error": f"http {r.status_code}", "text": r.text[:200]}
-        return True, r.json()
+        return True, _json_loads(r.content)
+    except requests.exceptions.ReadTimeout:
+        if POLL_WAIT_SEC > 0:
+            return True, {"commands": []}
+        return False, {"error": "exception ReadTimeout", "detail": f"no reply in {HTTP_TIMEOUT_SEC}s"}
     except Exception as e:
         return False, {"error": f"exception {type(e).__name__}", "detail": str(e)[:200]}
 
-def ack_command(nms_base: str, scanner: str, cmd_id: str, status: str, detail: str) -> None:
-    """Best-effort ACK. Never raise."""
-    url = f"{nms_base}/cmd/ack/{scanner}"
-    body = {
+def _ack_body(cmd_id: str, status: str, detail: str) -> Dict[str, Any]:
+    return {
         "cmd_id": cmd_id,
         "status": status,
         "detail": detail,
         "finished_at": local_ts(),  # MUST match TIME_FMT
     }
+
+def ack_command(ep: Endpoints, cmd_id: str, status: str, detail: str) -> None:
+    """Best-effort ACK. Never raise."""
+    body = _ack_body(cmd_id, status, detail)
     try:
-        r = requests.post(url, json=body, timeout=HTTP_TIMEOUT_SEC)
+        r = SESSION.post(ep.ack, data=_json_dumps(body), headers=_JSON_HEADERS, timeout=HTTP_TIMEOUT_SEC)
         if r.status_code != 200:
             log(f"ACK fail cmd_id={cmd_id} http={r.status_code} body={r.text[:200]}")
     except Exception as e:
         log(f"ACK exception cmd_id={cmd_id} {type(e).__name__}: {e}")
 
+# Flipped to False the first time the NMS answers 404 on /cmd/ack_batch
+_ACK_BATCH_SUPPORTED = True
+
+def ack_commands_batch(ep: Endpoints, acks: List[Dict[str, Any]]) -> None:
+    """
+    Best-effort batch ACK: one POST {"acks": [...]} for several commands.
+    Any failure (no batch endpoint, other HTTP error, exception) falls
+    through to per-command ack_command, so no ACK is lost. Never raise.
+    """
+    global _ACK_BATCH_SUPPORTED
+    if not acks:
+        return
+
+    if len(acks) > 1 and _ACK_BATCH_SUPPORTED:
+        try:
+            r = SESSION.post(ep.ack_batch, data=_json_dumps({"acks": acks}),
+                             headers=_JSON_HEADERS, timeout=HTTP_TIMEOUT_SEC)
+            if r.status_code == 200:
+                return
+            if r.status_code == 404:
+                _ACK_BATCH_SUPPORTED = False
+                log("ACK batch endpoint not found; using per-command ACK")
+            else:
+                log(f"ACK batch fail n={len(acks)} http={r.status_code} body={r.text[:200]}; per-command ACK")
+        except Exception as e:
+            log(f"ACK batch exception n={len(acks)} {type(e).__name__}: {e}; per-command ACK")
+
+    for a in acks:
+        ack_command(ep, a["cmd_id"], a["status"], a["detail"])
+
 def parse_args_json(s: str) -> Dict[str, Any]:
     """NMS stores args_json as JSON text. Pi parses it into dict."""
     if not s:
         return {}
+    # args are almost always an object; skip the parser for anything else
+    s = s.lstrip()
+    if not s.startswith("{"):
+        return {}
     try:
-        obj = json.loads(s)
+        obj = _json_loads(s)  # rejects trailing garbage
         return obj if isinstance(obj, dict) else {}
     except Exception:
         return {}
 
-def report_installed_bundle(nms_base: str, scanner: str, installed_version: str) -> None:
+def report_installed_bundle(ep: Endpoints, installed_version: str) -> None:
     """
     Best-effort bundle telemetry to NMS.
 
@@ -209,10 +372,9 @@ def report_installed_bundle(nms_base: str, scanner: str, installed_version: str)
       POST /bootstrap/report/{scanner}
       body: {"installed_version": "<bundle_id>"}
     """
-    url = f"{nms_base}/bootstrap/report/{scanner}"
     body = {"installed_version": installed_version}
     try:
-        r = requests.post(url, json=body, timeout=HTTP_TIMEOUT_SEC)
+        r = SESSION.post(ep.report, data=_json_dumps(body), headers=_JSON_HEADERS, timeout=HTTP_TIMEOUT_SEC)
         if r.status_code != 200:
             log(f"BOOTSTRAP report fail http={r.status_code} body={r.text[:200]}")
     except Exception as e:
@@ -255,20 +417,22 @@ def exec_av_stream_start(scanner: str, args: Dict[str, Any]) -> Tuple[bool, str]
     if not ok:
         return False, msg
 
-    ok2, out, err = _run_systemctl(["start", SERVICE_AVSTREAM])
+    ok2, out, err = run_systemctl(["start", SERVICE_AVSTREAM])
     return (True, f"started {SERVICE_AVSTREAM}") if ok2 else (False, f"start failed: {err or out}")
 
 def exec_av_stream_stop() -> Tuple[bool, str]:
-    ok, out, err = _run_systemctl(["stop", SERVICE_AVSTREAM])
+    ok, out, err = run_systemctl(["stop", SERVICE_AVSTREAM])
     return (True, f"stopped {SERVICE_AVSTREAM}") if ok else (False, f"stop failed: {err or out}")
 
+_AUDIO_PROC: Optional[subprocess.Popen] = None  # last audio.play child (this process)
+
 def exec_audio_play(scanner: str, args: Dict[str, Any]) -> Tuple[bool, str]:
     audio_file = (args.get("file") or "").strip()
     if not audio_file:
         return False, "audio.play missing args.file"
 
     stop_existing = bool(args.get("stop_existing", True))
-    if stop_existing:
+    if stop_existing and os.path.exists(AUDIO_PID_FILE):
         _ = exec_audio_stop(scanner, {})  # best-effort stop before playing
 
     ao = (args.get("ao") or AUDIO_AO_DEFAULT).strip()
@@ -284,9 +448,11 @@ def exec_audio_play(scanner: str, args: Dict[str, Any]) -> Tuple[bool, str]:
         audio_file,
     ]
 
+    global _AUDIO_PROC
     try:
         p = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _AUDIO_PROC = p
         with open(AUDIO_PID_FILE, "w") as f:
             f.write(str(p.pid))
         return True, f"audio.play started pid={p.pid} file={audio_file}"
@@ -319,6 +485,39 @@ def _pid_exists(pid: int) -> bool:
         # be conservative: if unsure, assume it exists
         return True
 
+def _wait_pid_exit(pid: int, timeout_sec: float) -> bool:
+    """
+    Wait up to timeout_sec for pid to exit. True if it is gone.
+    - Popen handle still held (_AUDIO_PROC): block in wait(), returns
+      the moment the child exits.
+    - Our own child without a handle: reaped via waitpid(WNOHANG),
+      detected within ~10 ms instead of a fixed sleep.
+    - Not our child (ChildProcessError, e.g. after an agent restart):
+      fall back to _pid_exists.
+    """
+    proc = _AUDIO_PROC
+    if proc is not None and proc.pid == pid:
+        try:
+            proc.wait(timeout=timeout_sec)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+        except Exception:
+            pass
+
+    deadline = time.monotonic() + timeout_sec
+    while True:
+        try:
+            wpid, _ = os.waitpid(pid, os.WNOHANG)
+            if wpid == pid:
+                return True
+        except ChildProcessError:
+            if not _pid_exists(pid):
+                return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+
 def _remove_pidfile(pidfile: str) -> None:
     try:
         os.remove(pidfile)
@@ -334,9 +533,13 @@ def exec_audio_stop(scanner: str, args: Dict[str, Any]) -> Tuple[bool, str]:
       - pid in pidfile does not exist anymore
       - process is terminated successfully
     """
+    # Common case: nothing was playing
+    if not os.path.exists(AUDIO_PID_FILE):
+        return True, "audio.stop ok (no pidfile)"
+
     pid = _read_pidfile(AUDIO_PID_FILE)
 
-    # No pidfile / unreadable pid => consider already stopped
+    # Unreadable pid => consider already stopped
     if pid <= 0:
         _remove_pidfile(AUDIO_PID_FILE)
         return True, "audio.stop ok (no pidfile / no pid)"
@@ -357,8 +560,7 @@ def exec_audio_stop(scanner: str, args: Dict[str, Any]) -> Tuple[bool, str]:
         pass
 
     # Give it a brief moment
-    time.sleep(0.3)
-    if not _pid_exists(pid):
+    if _wait_pid_exit(pid, 0.3):
         _remove_pidfile(AUDIO_PID_FILE)
         return True, f"audio.stop ok (pid {pid} terminated by SIGTERM)"
 
@@ -372,8 +574,7 @@ def exec_audio_stop(scanner: str, args: Dict[str, Any]) -> Tuple[bool, str]:
         # If we can't kill, report error
         return False, f"audio.stop failed: SIGKILL exception {type(e).__name__}: {e}"
 
-    time.sleep(0.3)
-    if not _pid_exists(pid):
+    if _wait_pid_exit(pid, 0.3):
         _remove_pidfile(AUDIO_PID_FILE)
         return True, f"audio.stop ok (pid {pid} killed by SIGKILL)"
 
@@ -408,12 +609,8 @@ def exec_tts_say(scanner: str, args: Dict[str, Any]) -> Tuple[bool, str]:
 def exec_voice_start(args: Dict[str, Any]) -> Tuple[bool, str]:
     """
     Wave-2: start scanner-voice.service + write initial config.
+    One read-modify-write of voice_config.json.
     """
-    try:
-        ensure_voice_config()
-    except Exception:
-        pass
-
     mode = (args.get("mode") or "").strip() or "name_listen"
     conv_to = int(args.get("conversation_timeout_sec") or 20)
     llm_to = int(args.get("llm_timeout_sec") or 30)
@@ -421,14 +618,14 @@ def exec_voice_start(args: Dict[str, Any]) -> Tuple[bool, str]:
     # For Wave-2, script may be provided here or via voice.script.set
     script = validate_script(args.get("commands") or args.get("script"))
 
-    new_cfg = update_voice_config({
-        "mode": mode,
-        "conversation_timeout_sec": conv_to,
-        "llm_timeout_sec": llm_to,
-        "script": script if script else load_voice_config().get("script", []),
-    })
+    with voice_config_transaction() as new_cfg:  # also ensures the file exists
+        new_cfg["mode"] = mode
+        new_cfg["conversation_timeout_sec"] = conv_to
+        new_cfg["llm_timeout_sec"] = llm_to
+        if script:
+            new_cfg["script"] = script
 
-    ok, out, err = _run_systemctl(["start", SERVICE_VOICE])
+    ok, out, err = run_systemctl(["start", SERVICE_VOICE])
     if ok:
         return True, f"started {SERVICE_VOICE} mode={new_cfg.get('mode')} script_len={len(new_cfg.get('script') or [])}"
     return False, f"start failed: {err or out}"
@@ -443,7 +640,7 @@ def exec_voice_stop() -> Tuple[bool, str]:
     except Exception:
         pass
 
-    ok, out, err = _run_systemctl(["stop", SERVICE_VOICE])
+    ok, out, err = run_systemctl(["stop", SERVICE_VOICE])
     if ok:
         return True, f"stopped {SERVICE_VOICE}"
     return False, f"stop failed: {err or out}"
@@ -469,18 +666,19 @@ def exec_voice_script_set(args: Dict[str, Any]) -> Tuple[bool, str]:
     update_voice_config({"script": commands})
     return True, f"voice script updated script_len={len(commands)}"
 
-def dispatch(nms_base: str, scanner: str, cmd_fields: Dict[str, Any]) -> Tuple[str, str]:
+def dispatch(ep: Endpoints, cmd_fields: Dict[str, Any]) -> Tuple[str, str]:
     """
     Execute one command.
     Returns (status, detail) where status in {'ok','error'}.
     """
+    scanner = ep.scanner
     category = (cmd_fields.get("category") or "").strip()
     action = (cmd_fields.get("action") or "").strip()
     args = parse_args_json(cmd_fields.get("args_json") or "")
 
     # Policy: allow only known categories.
     # (scan already exists; av added for streaming)
-    if category and category not in ("scan", "av", "voice"):
+    if category and category not in _ALLOWED_CATS:
         return "error", f"unsupported category={category}"
 
     if action == "scan.start":
@@ -506,7 +704,7 @@ def dispatch(nms_base: str, scanner: str, cmd_fields: Dict[str, Any]) -> Tuple[s
         status = "ok" if ok else "error"
 
         if ok:
-            report_installed_bundle(nms_base, scanner, bundle_id)
+            report_installed_bundle(ep, bundle_id)
 
         return status, detail
 
@@ -549,10 +747,107 @@ def dispatch(nms_base: str, scanner: str, cmd_fields: Dict[str, Any]) -> Tuple[s
     return "error", f"unknown action={action}"
 
 
-def main() -> None:
-    log(f"agent started poll={POLL_INTERVAL_SEC}s limit={POLL_LIMIT}")
+# cmd_ids queued or running; an id leaves only after its ACK was sent, so an
+# unACKed entry the NMS hands back on the next poll is not executed twice.
+# ACKed ids are remembered a little longer (_DONE_*): a poll answered before
+# the ACK reached NMS can still list them.
+_INFLIGHT: set = set()
+_INFLIGHT_LOCK = threading.Lock()
+_DONE_MAX = 64
+_DONE_IDS: deque = deque()
+_DONE_SET: set = set()
+# "queue full" error ACKs, sent by the worker with its next batch so the
+# shared HTTP session is only ever used from the worker thread for ACKs
+_BUSY_ACKS: deque = deque()
+
+def _seen_cmd(cmd_id: str) -> bool:
+    """True if cmd_id is queued, running or recently ACKed; else mark it in flight."""
+    with _INFLIGHT_LOCK:
+        if cmd_id in _INFLIGHT or cmd_id in _DONE_SET:
+            return True
+        _INFLIGHT.add(cmd_id)
+        return False
 
+def _mark_done(cmd_ids: List[str]) -> None:
+    with _INFLIGHT_LOCK:
+        for cmd_id in cmd_ids:
+            _INFLIGHT.discard(cmd_id)
+            if cmd_id in _DONE_SET:
+                continue
+            if len(_DONE_IDS) >= _DONE_MAX:
+                _DONE_SET.discard(_DONE_IDS.popleft())
+            _DONE_IDS.append(cmd_id)
+            _DONE_SET.add(cmd_id)
+
+def _worker_loop(cmd_q: "queue.Queue[Tuple[Endpoints, str, Dict[str, Any]]]") -> None:
+    """
+    Single command executor. Runs dispatch + ACK off the poll loop so a long
+    scan.once / tts.say doesn't stop us from polling (e.g. a queued scan.stop).
+    One worker => commands still execute in NMS order.
+    Everything already queued (normally one poll's worth) is run as a batch
+    and ACKed with a single request.
+    """
     while True:
+        batch = [cmd_q.get()]
+        while True:
+            try:
+                batch.append(cmd_q.get_nowait())
+            except queue.Empty:
+                break
+
+        acks: Dict[Endpoints, List[Dict[str, Any]]] = {}
+        for ep, cmd_id, fields in batch:
+            try:
+                status, detail = dispatch(ep, fields)
+            except Exception as e:
+                status, detail = "error", f"dispatch exception: {type(e).__name__}: {e}"
+            log(f"RESULT cmd_id={cmd_id} status={status} detail={detail}")
+            acks.setdefault(ep, []).append(_ack_body(cmd_id, status, detail))
+        while _BUSY_ACKS:
+            ep, body = _BUSY_ACKS.popleft()
+            acks.setdefault(ep, []).append(body)
+
+        for ep, ep_acks in acks.items():
+            ack_commands_batch(ep, ep_acks)
+        _mark_done([a["cmd_id"] for ep_acks in acks.values() for a in ep_acks])
+        for _ in batch:
+            cmd_q.task_done()
+
+def _backoff_delay(base_sec: float, fail_streak: int) -> float:
+    """
+    Exponential backoff for consecutive offline/poll failures:
+    base * 2^streak, capped at BACKOFF_MAX_SEC, plus up to 10% jitter so a
+    lab full of scanners doesn't retry in lockstep after an outage.
+    """
+    delay = min(float(BACKOFF_MAX_SEC), base_sec * (2 ** min(fail_streak, 16)))
+    return delay + random.uniform(0, delay * 0.1)
+
+# Set by SIGTERM/SIGINT: every main-loop sleep wakes at once and the loop exits
+_STOP = threading.Event()
+
+def _request_stop(signum, frame) -> None:
+    _STOP.set()
+
+def _sleep_until(deadline: float) -> None:
+    """Sleep until a time.monotonic() deadline (no-op if already past)."""
+    _STOP.wait(max(0.0, deadline - time.monotonic()))
+
+def main() -> None:
+    _setup_logging()
+    log(f"agent started poll={POLL_INTERVAL_SEC}s limit={POLL_LIMIT} systemctl={' '.join(systemctl_prefix(refresh=True))}")
+
+    ep = None  # Endpoints; rebuilt when nms_base or scanner changes
+    fail_streak = 0  # consecutive offline / poll failures
+
+    # Bounded so a flood of commands can't grow memory without limit
+    cmd_q: "queue.Queue[Tuple[Endpoints, str, Dict[str, Any]]]" = queue.Queue(maxsize=CMD_QUEUE_MAX)
+    threading.Thread(target=_worker_loop, args=(cmd_q,), daemon=True).start()
+    _init_name_watch()
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    while not _STOP.is_set():
         # 1) Ensure identity
         scanner = read_scanner_name()
         if not scanner:
@@ -561,26 +856,39 @@ def main() -> None:
             scanner = read_scanner_name()
             if not scanner:
                 log(f"still unassigned; retry in {REGISTER_RETRY_SEC}s")
-                time.sleep(REGISTER_RETRY_SEC)
+                _STOP.wait(REGISTER_RETRY_SEC)
                 continue
 
         # 2) Ensure NMS is reachable
         nms_base = get_nms_base()
         if not nms_base:
-            log(f"offline: no NMS reachable; retry in {OFFLINE_RETRY_SEC}s")
-            time.sleep(OFFLINE_RETRY_SEC)
+            delay = _backoff_delay(OFFLINE_RETRY_SEC, fail_streak)
+            fail_streak += 1
+            log(f"offline: no NMS reachable; retry in {delay:.1f}s (fail_streak={fail_streak})")
+            _STOP.wait(delay)
             continue
 
+        if ep is None or ep.base != nms_base or ep.scanner != scanner:
+            ep = build_endpoints(nms_base, scanner)
+
         # 3) Poll
-        ok, payload = fetch_commands(nms_base, scanner)
+        # Cadence is measured from poll start, so slow handlers don't add drift.
+        # A long-poll that the NMS held past the interval needs no extra sleep;
+        # if the NMS ignores ?wait we still keep the normal cadence.
+        next_poll = time.monotonic() + POLL_INTERVAL_SEC
+        ok, payload = fetch_commands(ep)
         if not ok:
-            log(f"poll fail scanner={scanner} via={nms_base} {payload}")
-            time.sleep(POLL_INTERVAL_SEC)
+            delay = _backoff_delay(POLL_INTERVAL_SEC, fail_streak)
+            fail_streak += 1
+            log(f"poll fail scanner={scanner} via={nms_base} {payload}; retry in {delay:.1f}s")
+            invalidate_nms_cache()  # re-probe (and maybe fail over) next round
+            _STOP.wait(delay)
             continue
+        fail_streak = 0
 
         cmds = payload.get("commands") or []
         if not cmds:
-            time.sleep(POLL_INTERVAL_SEC)
+            _sleep_until(next_poll)
             continue
 
         for item in cmds:
@@ -599,17 +907,27 @@ def main() -> None:
                 log(f"skip command without cmd_id xid={xid} action={action}")
                 continue
 
-            log(f"EXEC cmd_id={cmd_id} action={action} execute_at={execute_at} xid={xid}")
+            if _seen_cmd(cmd_id):
+                continue  # already queued/running, or ACKed after this poll was answered
 
-            status, detail = dispatch(nms_base, scanner, fields)
-            log(f"RESULT cmd_id={cmd_id} status={status} detail={detail}")
+            try:
+                cmd_q.put_nowait((ep, cmd_id, fields))
+            except queue.Full:
+                # stays in flight until the worker (busy with a full queue) ACKs it
+                log(f"DROP cmd_id={cmd_id} action={action}: queue full ({CMD_QUEUE_MAX})")
+                _BUSY_ACKS.append((ep, _ack_body(cmd_id, "error", f"agent busy: command queue full ({CMD_QUEUE_MAX})")))
+                continue
+
+            log(f"EXEC cmd_id={cmd_id} action={action} execute_at={execute_at} xid={xid}")
 
-            ack_command(nms_base, scanner, cmd_id, status, detail)
+        _sleep_until(next_poll)
 
-        time.sleep(POLL_INTERVAL_SEC)
+    log("agent stopping (signal)")
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
         pass
+    finally:
+        close_nms_session()
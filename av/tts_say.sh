@@ -3,37 +3,44 @@ set -euo pipefail
 
 # usage:
 #   tts_say.sh "hello world" [lead_silence_ms] [volume]
+#   TTS_PRINT_CMD=1 tts_say.sh ...   # synthesize/cache only, print the mpv argv
+#                                    # (NUL-separated, WAV path last) instead of playing
 TEXT="${1:-}"
 LEAD_MS="${2:-300}"
 MPV_VOL="${3:-120}"     # mpv gain; 100 = nominal, >100 boosts
 RATE="${4:-140}"        # espeak speed (words per minute-ish). Try 120-160
 AMP="${5:-200}"         # espeak amplitude 0-200
 
-RAW="/tmp/tts_raw.wav"
-PAD="/tmp/tts_pad.wav"
-OUT="/tmp/tts_padded.wav"
+# Synthesized phrases are cached by (text, rate, amp): the fixed prompts
+# ("I am listening.", ...) are spoken over and over, espeak runs once for each.
+CACHE_DIR="${TTS_CACHE_DIR:-/tmp/tts_cache}"
+CACHE_MAX="${TTS_CACHE_MAX:-64}"
 
-rm -f "$RAW" "$PAD" "$OUT"
+[[ -d "$CACHE_DIR" ]] || mkdir -p "$CACHE_DIR"
+KEY=$(printf '%s|%s|%s' "$TEXT" "$RATE" "$AMP" | sha1sum | cut -c1-40)
+RAW="$CACHE_DIR/$KEY.wav"
 
 # 1) TTS -> RAW wav (espeak-ng is lightweight and usually available)
 # (If your Pi uses another backend later, swap this line only.)
 # /usr/bin/espeak-ng -w "$RAW" "$TEXT"
-/usr/bin/espeak-ng -s "$RATE" -a "$AMP" -w "$RAW" "$TEXT"
+if [[ -s "$RAW" ]]; then
+  touch "$RAW"  # keep recently used entries at the front for pruning
+else
+  /usr/bin/espeak-ng -s "$RATE" -a "$AMP" -w "$RAW.tmp" "$TEXT"
+  mv -f "$RAW.tmp" "$RAW"
+  # prune least recently used beyond CACHE_MAX
+  ls -1t "$CACHE_DIR"/*.wav 2>/dev/null | tail -n +$(( CACHE_MAX + 1 )) | xargs -r rm -f
+fi
 
-# 2) Make a short silence wav
-/usr/bin/ffmpeg -hide_banner -loglevel error \
-  -f lavfi -i "anullsrc=r=48000:cl=mono" -t "$(python3 - <<PY
-ms=int(${LEAD_MS}); print(ms/1000.0)
-PY
-)" \
-  -c:a pcm_s16le "$PAD"
-
-# 3) Concatenate silence + speech
-/usr/bin/ffmpeg -hide_banner -loglevel error \
-  -i "$PAD" -i "$RAW" \
-  -filter_complex "[0:a][1:a]concat=n=2:v=0:a=1[a]" -map "[a]" \
-  -ar 48000 -ac 1 -c:a pcm_s16le "$OUT"
-
-# 4) Play
+# 2) Play, with the lead silence inserted by mpv's audio filter
+#    (adelay pads real silent samples, same as the old ffmpeg pad+concat step,
+#    without two extra ffmpeg runs and a python3 fork per phrase)
 # /usr/bin/mpv --ao=alsa --audio-device=alsa/default --no-video --volume="$VOL" "$OUT" >/dev/null 2>&1
-/usr/bin/mpv --ao=alsa --audio-device=alsa/default --no-video --volume="$MPV_VOL" "$OUT" >/dev/null 2>&1
+LEAD_MS=$(( LEAD_MS > 0 ? LEAD_MS : 0 ))
+PLAY=(/usr/bin/mpv --ao=alsa --audio-device=alsa/default --no-video --volume="$MPV_VOL"
+  --af="lavfi=[adelay=delays=${LEAD_MS}:all=1]" "$RAW")
+if [[ -n "${TTS_PRINT_CMD:-}" ]]; then
+  printf '%s\0' "${PLAY[@]}"
+  exit 0
+fi
+"${PLAY[@]}" >/dev/null 2>&1
@@ -14,18 +14,26 @@ Responsibilities:
 No rollback. No version arbitration. Pi is dumb by design.
 """
 
+import os
+import shutil
 import subprocess
+import tempfile
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple
-from config import BASE_DIR, SYSTEMCTL, SUDO, SERVICE_SCANNER_POLLER, SERVICE_UPLOADER
-
-import requests
+from typing import IO, Tuple
+from config import BASE_DIR, SYSTEMCTL, SUDO, SERVICE_SCANNER_POLLER, SERVICE_UPLOADER, HTTP_SESSION
 
 BUNDLES_DIR = BASE_DIR / "bundles"
 ACTIVE_LINK = BUNDLES_DIR / "active"
 ACTIVE_BUNDLE_FILE = BUNDLES_DIR / "active_bundle.txt"
 HTTP_TIMEOUT = 30
+# Bundles up to this size stay in RAM; larger ones spill to a temp file
+BUNDLE_SPOOL_MAX_BYTES = 32 * 1024 * 1024
+# Parallel extraction (inflate of one member overlaps the SD write of another)
+EXTRACT_WORKERS = 4
+EXTRACT_PARALLEL_MIN = 8   # fewer members than this: plain serial extract
 
 
 def _run(cmd, timeout=30) -> Tuple[bool, str]:
@@ -41,10 +49,19 @@ def _run(cmd, timeout=30) -> Tuple[bool, str]:
     except subprocess.CalledProcessError as e:
         return False, (e.stderr or e.stdout or "").strip()
 
+# None = unknown; True once plain systemctl was refused but sudo -n worked
+_NEED_SUDO = None
+
 def _systemctl(action: str, service: str) -> None:
-    # best-effort; try normal then sudo -n
-    _run([SYSTEMCTL, action, service])
-    _run([SUDO, "-n", SYSTEMCTL, action, service])
+    # best-effort; try normal then sudo -n (skip the plain try once sudo is known needed)
+    global _NEED_SUDO
+    if not _NEED_SUDO:
+        ok, _ = _run([SYSTEMCTL, action, service])
+        if ok:
+            return
+    ok, _ = _run([SUDO, "-n", SYSTEMCTL, action, service])
+    if ok:
+        _NEED_SUDO = True
 
 def stop_all_services() -> None:
     _systemctl("stop", SERVICE_SCANNER_POLLER)
@@ -53,28 +70,96 @@ def stop_all_services() -> None:
 def restart_uploader() -> None:
     _systemctl("restart", SERVICE_UPLOADER)
 
-def _download_bundle(url: str, dst_zip: Path) -> None:
-    r = requests.get(url, stream=True, timeout=HTTP_TIMEOUT)
+def _download_bundle(url: str) -> IO[bytes]:
+    """
+    Stream the bundle ZIP into a SpooledTemporaryFile (no /tmp staging write
+    for normal-size bundles). Caller closes it.
+    If the NMS sends X-Bundle-CRC32 (hex), the CRC is computed in-flight and
+    a mismatch raises before anything is extracted.
+    """
+    r = HTTP_SESSION.get(url, stream=True, timeout=HTTP_TIMEOUT)
     r.raise_for_status()
-    with dst_zip.open("wb") as f:
-        for chunk in r.iter_content(chunk_size=8192):
+    expected = (r.headers.get("X-Bundle-CRC32") or "").strip()
+    buf = tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_MAX_BYTES)
+    try:
+        crc = 0
+        for chunk in r.iter_content(chunk_size=65536):
             if chunk:
-                f.write(chunk)
-
-def _extract_zip(src_zip: Path, dst_dir: Path) -> None:
+                buf.write(chunk)
+                crc = zlib.crc32(chunk, crc)
+        if expected and int(expected, 16) != crc:
+            raise RuntimeError(f"bundle CRC32 mismatch: got {crc:08x}, expected {expected}")
+        buf.seek(0)
+        return buf
+    except Exception:
+        buf.close()
+        raise
+
+def _extract_zip(src_zip: IO[bytes], dst_dir: Path) -> None:
+    """
+    Extract all members into dst_dir.
+    - Every member path is checked against dst_dir first (zip-slip guard)
+    - install.sh is made executable here, so the install hook needs no chmod
+    Larger archives are extracted by a small thread pool sharing one ZipFile
+    (zipfile serializes the underlying seeks/reads; zlib inflate releases the GIL).
+    """
+    dst_real = os.path.realpath(dst_dir)
     with zipfile.ZipFile(src_zip, "r") as zf:
-        zf.extractall(dst_dir)
+        infos = zf.infolist()
+        for info in infos:
+            target = os.path.realpath(os.path.join(dst_real, info.filename))
+            if not target.startswith(dst_real + os.sep):
+                raise RuntimeError(f"zip-slip: {info.filename}")
+
+        if len(infos) < EXTRACT_PARALLEL_MIN:
+            for info in infos:
+                zf.extract(info, dst_dir)
+        else:
+            # Create directories up front so workers never race on makedirs
+            for info in infos:
+                target = dst_dir / info.filename
+                (target if info.is_dir() else target.parent).mkdir(parents=True, exist_ok=True)
+
+            files = [info for info in infos if not info.is_dir()]
+            with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as ex:
+                futures = [ex.submit(zf.extract, info, dst_dir) for info in files]
+                for fut in futures:
+                    fut.result()  # re-raise the first extraction error
+
+    hook = dst_dir / "install.sh"
+    if hook.is_file():
+        hook.chmod(0o755)
 
 def _run_install_hook(bundle_dir: Path) -> None:
     hook = bundle_dir / "install.sh"
     if not hook.exists():
         return
 
-    hook.chmod(0o755)
     ok, out = _run(["/usr/bin/bash", str(hook)], timeout=180)
     if not ok:
         raise RuntimeError(f"install.sh failed: {out}")
 
+def _swap_active_link(bundle_dir: Path) -> None:
+    """Point bundles/active at bundle_dir via symlink-to-temp + rename."""
+    tmp = str(ACTIVE_LINK.with_name("active.tmp"))
+    try:
+        os.remove(tmp)
+    except FileNotFoundError:
+        pass
+    os.symlink(str(bundle_dir), tmp)
+    os.replace(tmp, str(ACTIVE_LINK))
+
+def _write_active_bundle_file(bundle_id: str) -> None:
+    """Atomic write of active_bundle.txt (tmp + rename); skipped on re-apply."""
+    try:
+        if ACTIVE_BUNDLE_FILE.read_text(encoding="utf-8").strip() == bundle_id:
+            return
+    except Exception:
+        pass
+    tmp = ACTIVE_BUNDLE_FILE.with_suffix(".txt.tmp")
+    tmp.write_text(bundle_id + "\n", encoding="utf-8")
+    os.replace(tmp, ACTIVE_BUNDLE_FILE)
+
 def apply_bundle(bundle_id: str, url: str) -> Tuple[bool, str]:
     """
     Apply a bundle specified by (bundle_id, url).
@@ -88,27 +173,19 @@ def apply_bundle(bundle_id: str, url: str) -> Tuple[bool, str]:
         # 1) HARD STOP
         stop_all_services()
 
-        # 2) Download
-        tmp_zip = Path("/tmp") / f"{bundle_id}.zip"
-        if tmp_zip.exists():
-            tmp_zip.unlink()
-
-        _download_bundle(url, tmp_zip)
-
-        # 3) Extract
-        bundle_dir = BUNDLES_DIR / bundle_id
-        if bundle_dir.exists():
-            # overwrite semantics: remove old bundle completely
-            subprocess.run(["rm", "-rf", str(bundle_dir)], check=False)
-
-        _extract_zip(tmp_zip, bundle_dir)
+        # 2) Download (into memory / spooled temp file)
+        with _download_bundle(url) as zip_buf:
+            # 3) Extract
+            bundle_dir = BUNDLES_DIR / bundle_id
+            if bundle_dir.exists():
+                # overwrite semantics: remove old bundle completely
+                shutil.rmtree(bundle_dir, ignore_errors=True)
 
-        # 4) Activate
-        if ACTIVE_LINK.exists() or ACTIVE_LINK.is_symlink():
-            ACTIVE_LINK.unlink()
-        ACTIVE_LINK.symlink_to(bundle_dir)
+            _extract_zip(zip_buf, bundle_dir)
 
-        ACTIVE_BUNDLE_FILE.write_text(bundle_id + "\n", encoding="utf-8")
+        # 4) Activate (atomic: never a moment without a valid 'active' link)
+        _swap_active_link(bundle_dir)
+        _write_active_bundle_file(bundle_id)
 
         # 5) Install hook
         _run_install_hook(bundle_dir)
@@ -6,13 +6,22 @@ Single source of truth for:
 - NMS discovery
 - common paths
 - time format helpers
+- systemd unit control (run_systemctl)
 """
 
 import os
+import socket
+import subprocess
+import time
+import ipaddress
 import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
 from pathlib import Path
-from typing import Optional
-from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 BASE_DIR = Path("/home/pi/_RunScanner")
 
@@ -23,9 +32,21 @@ BASE_DIR = Path("/home/pi/_RunScanner")
 # ONE official time format everywhere (Pi <-> NMS)
 TIME_FMT: str = "%Y-%m-%d-%H:%M:%S"
 
+_TS_CACHE = (-1, "")  # (epoch second, formatted string)
+
 def local_ts() -> str:
-    """Return current local time string in TIME_FMT."""
-    return datetime.now().strftime(TIME_FMT)
+    """
+    Return current local time string in TIME_FMT.
+    TIME_FMT has 1s resolution, so the string is formatted once per second.
+    """
+    global _TS_CACHE
+    sec = int(time.time())
+    cached_sec, cached = _TS_CACHE
+    if sec == cached_sec:
+        return cached
+    ts = time.strftime(TIME_FMT, time.localtime(sec))
+    _TS_CACHE = (sec, ts)
+    return ts
 
 # ------------------------------------------------------------------
 # NMS discovery
@@ -39,11 +60,70 @@ NMS_CANDIDATES = [
 
 NMS_CACHE_FILE = BASE_DIR / "nms_base.txt"
 NMS_TIMEOUT_SEC = 3
+NMS_PROBE_GRACE_SEC = 0.3  # extra wait for a preferred NMS once a fallback answered
+
+# TCP keepalive on pooled sockets so idle NMS connections (between polls /
+# minute uploads) aren't silently dropped by middleboxes and re-handshaked.
+KEEPALIVE_SOCKET_OPTIONS = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+                            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+for _name, _val in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+    if hasattr(socket, _name):  # Linux-only constants
+        KEEPALIVE_SOCKET_OPTIONS.append((socket.IPPROTO_TCP, getattr(socket, _name), _val))
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets carry KEEPALIVE_SOCKET_OPTIONS."""
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", KEEPALIVE_SOCKET_OPTIONS)
+        super().init_poolmanager(*args, **kwargs)
+
+class _PinnedHTTPConnection(HTTPConnection):
+    """Dials a _pin_base()-recorded host at resolve_host()'s cached IP."""
+    def _new_conn(self):
+        host = self._dns_host
+        if host not in _PINNED_HOSTS:
+            return super()._new_conn()
+        self._dns_host = resolve_host(host) or host
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+
+class _PinnedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PinnedHTTPConnection
+
+class NmsAdapter(KeepAliveAdapter):
+    """
+    KeepAliveAdapter for NMS sessions that also pins the NMS hostname's dial
+    address (see _pin_base). Only sessions mounting it are affected; the URL,
+    Host header and other urllib3 users are left alone.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            **self.poolmanager.pool_classes_by_scheme,
+            "http": _PinnedHTTPConnectionPool,
+        }
+
+# One keep-alive connection pool per process for all NMS traffic
+# (/health probes, agent poll/ACK, bundle download).
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("http://", NmsAdapter(pool_connections=4, pool_maxsize=4, max_retries=0))
+HTTP_SESSION.headers.update({"Connection": "keep-alive"})
+
+def close_nms_session() -> None:
+    """Release pooled NMS connections (call on process shutdown)."""
+    try:
+        HTTP_SESSION.close()
+    except Exception:
+        pass
 
 BUNDLES_DIR = BASE_DIR / "bundles"
 ACTIVE_BUNDLE_FILE = BUNDLES_DIR / "active_bundle.txt"  # written by bundle_manager.py
 
 
+BUNDLE_VERSION_TTL_SEC = 2.0
+_BUNDLE_VERSION_CACHE = ("", 0.0)  # (value, expires monotonic)
+
 def get_bundle_version() -> str:
     """
     Return current bundle version/id from bundles/active_bundle.txt.
@@ -51,17 +131,25 @@ def get_bundle_version() -> str:
     Operational policy:
     - SD-clone image should ship with a valid version like "robotBundle1.0".
     - "0" is reserved as a fallback meaning: unknown/uninitialized (should be rare).
+    - Cached for BUNDLE_VERSION_TTL_SEC so GUI redraws don't reopen the file.
     """
+    global _BUNDLE_VERSION_CACHE
+    now = time.monotonic()
+    value, expires = _BUNDLE_VERSION_CACHE
+    if value and now < expires:
+        return value
     try:
         s = ACTIVE_BUNDLE_FILE.read_text(encoding="utf-8").strip()
-        return s if s else "0"
+        value = s if s else "0"
     except Exception:
-        return "0"
+        value = "0"
+    _BUNDLE_VERSION_CACHE = (value, now + BUNDLE_VERSION_TTL_SEC)
+    return value
 
 def _probe_nms(base: str) -> bool:
     """Return True if NMS /health responds."""
     try:
-        r = requests.get(f"{base}/health", timeout=NMS_TIMEOUT_SEC)
+        r = HTTP_SESSION.get(f"{base}/health", timeout=NMS_TIMEOUT_SEC)
         return r.status_code == 200
     except Exception:
         return False
@@ -72,30 +160,263 @@ def discover_nms_base(force: bool = False) -> Optional[str]:
 
     Priority:
     1) cached value (if still alive)
-    2) ordered NMS_CANDIDATES probe
+    2) NMS_CANDIDATES probed in parallel, first alive in list order wins
     """
-    if not force and NMS_CACHE_FILE.exists():
-        cached = NMS_CACHE_FILE.read_text().strip()
+    if not force:
+        try:
+            cached = NMS_CACHE_FILE.read_text(encoding="utf-8").strip()
+        except OSError:
+            cached = ""
         if cached and _probe_nms(cached):
             return cached
 
-    for base in NMS_CANDIDATES:
-        if _probe_nms(base):
-            try:
-                NMS_CACHE_FILE.write_text(base, encoding="utf-8")
-            except Exception:
-                pass
-            return base
+    base = _probe_candidates()
+    if base:
+        try:
+            NMS_CACHE_FILE.write_text(base, encoding="utf-8")
+        except Exception:
+            pass
+    return base
+
+def _probe_candidates() -> Optional[str]:
+    """
+    Probe all NMS_CANDIDATES concurrently (worst case one NMS_TIMEOUT_SEC, not N).
+    - A candidate wins as soon as it is alive and every higher-preference one is dead
+    - Once any probe succeeds, higher-preference probes get NMS_PROBE_GRACE_SEC more
+    """
+    ex = ThreadPoolExecutor(max_workers=len(NMS_CANDIDATES))
+    try:
+        futures = [ex.submit(_probe_nms, base) for base in NMS_CANDIDATES]
+        alive: dict = {}  # future -> bool
+        pending = set(futures)
+        end = time.monotonic() + NMS_TIMEOUT_SEC + 0.5
+        grace_end = None
+        while pending:
+            now = time.monotonic()
+            timeout = end - now if grace_end is None else min(end, grace_end) - now
+            if timeout <= 0:
+                break
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                alive[fut] = fut.result()  # _probe_nms never raises
+                if alive[fut] and grace_end is None:
+                    grace_end = time.monotonic() + NMS_PROBE_GRACE_SEC
+
+            for base, fut in zip(NMS_CANDIDATES, futures):
+                if fut not in alive:
+                    break  # a preferred candidate is still undecided
+                if alive[fut]:
+                    return base
+
+        for base, fut in zip(NMS_CANDIDATES, futures):
+            if alive.get(fut):
+                return base
+        return None
+    finally:
+        # Don't wait on slower, lower-preference probes once we have a winner
+        ex.shutdown(wait=False, cancel_futures=True)
+
+# DNS pinning: only matters if a candidate is a hostname (defaults are IPs)
+DNS_TTL_OK_SEC = 300
+DNS_TTL_FAIL_SEC = 30
+_DNS_CACHE: Dict[str, Tuple[Optional[str], float]] = {}  # host -> (ip or None, expires)
+
+def resolve_host(host: str) -> Optional[str]:
+    """
+    Resolve host to an IP with a small TTL cache (positive 300 s, negative 30 s).
+    IP literals are returned as-is without touching the resolver.
+    """
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+
+    now = time.monotonic()
+    hit = _DNS_CACHE.get(host)
+    if hit and now < hit[1]:
+        return hit[0]
+    try:
+        ip = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)[0][4][0]
+        _DNS_CACHE[host] = (ip, now + DNS_TTL_OK_SEC)
+    except OSError:
+        ip = None
+        _DNS_CACHE[host] = (None, now + DNS_TTL_FAIL_SEC)
+    return ip
+
+# Connect-time pinning (NmsAdapter): the URL keeps its hostname (Host header
+# unchanged); only the address NMS sessions dial comes from resolve_host()
+_PINNED_HOSTS: set = set()
+
+def _pin_base(base: str) -> str:
+    """
+    Pin base's hostname to its cached IP at connect time; base itself is
+    returned unchanged (IP literals need no pinning).
+    """
+    host = urlsplit(base).hostname or ""
+    if host and resolve_host(host) != host:
+        _PINNED_HOSTS.add(host)
+    return base
+
+# In-process cache for get_nms_base(): long TTL when found, short when offline
+NMS_CACHE_TTL_OK_SEC = 60
+NMS_CACHE_TTL_FAIL_SEC = 5
+_NMS_CACHE: dict = {"base": None, "expires": 0.0}
 
-    return None
+def invalidate_nms_cache() -> None:
+    """Force the next get_nms_base() to re-probe (e.g. after a failed poll)."""
+    _NMS_CACHE["expires"] = 0.0
 
 def get_nms_base() -> Optional[str]:
-    """Return active NMS base URL, or None if unavailable."""
-    return discover_nms_base(force=False)
+    """
+    Return active NMS base URL, or None if unavailable.
+    Result is cached in-process (NMS_CACHE_TTL_OK_SEC / NMS_CACHE_TTL_FAIL_SEC)
+    so a 5 s poll loop doesn't re-read nms_base.txt and re-probe /health each time.
+    """
+    now = time.monotonic()
+    if now < _NMS_CACHE["expires"]:
+        return _NMS_CACHE["base"]
+
+    base = discover_nms_base(force=False)
+    if base:
+        base = _pin_base(base)
+    ttl = NMS_CACHE_TTL_OK_SEC if base else NMS_CACHE_TTL_FAIL_SEC
+    _NMS_CACHE["base"] = base
+    _NMS_CACHE["expires"] = now + ttl
+    return base
 
 
 SYSTEMCTL = "/usr/bin/systemctl"
 SUDO = "/usr/bin/sudo"
+SYSTEMCTL_TIMEOUT_SEC = int(os.getenv("SYSTEMCTL_TIMEOUT_SEC", "20"))
+
+# Optional: drive systemd units over D-Bus (no fork+exec); systemctl is the fallback
+try:
+    from pystemd.systemd1 import Unit as _SdUnit  # type: ignore
+except Exception:
+    _SdUnit = None
+
+_SD_UNITS: Dict[str, Any] = {}  # service name -> loaded pystemd Unit
+
+def _sd_job_done(unit: Any, action: str, timeout: float) -> Tuple[bool, str]:
+    """
+    Start/Stop/Restart over D-Bus only queue a job. Wait until the unit has
+    no pending job; returns (ended where the action should leave it, ActiveState).
+    """
+    deadline = time.monotonic() + timeout
+    while unit.Unit.Job[0] != 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    state = unit.Unit.ActiveState.decode("utf-8", "replace")
+    if action == "stop":
+        return state in ("inactive", "failed"), state
+    return state == "active", state
+
+def _sd_unit_call(action: str, service: str) -> Optional[Tuple[bool, str, str]]:
+    """
+    start/stop/restart/is-active over D-Bus via pystemd, waiting for the job.
+    Returns None (caller falls back to systemctl) only if the call could not
+    be made: pystemd missing, unsupported action, load or polkit failure.
+    Once the job is queued the outcome is final, so a failing unit is never
+    started/stopped a second time by systemctl.
+    """
+    if _SdUnit is None or action not in ("start", "stop", "restart", "is-active"):
+        return None
+    try:
+        unit = _SD_UNITS.get(service)
+        if unit is None:
+            unit = _SdUnit(service.encode("utf-8"))
+            unit.load()
+            _SD_UNITS[service] = unit
+        if action == "is-active":
+            state = unit.Unit.ActiveState.decode("utf-8", "replace")
+            return state == "active", state, ""
+        if action == "start":
+            unit.Unit.Start(b"replace")
+        elif action == "stop":
+            unit.Unit.Stop(b"replace")
+        else:
+            unit.Unit.Restart(b"replace")
+    except Exception:
+        return None
+    try:
+        ok, state = _sd_job_done(unit, action, SYSTEMCTL_TIMEOUT_SEC)
+    except Exception as e:
+        return False, "", f"{service} {action}: {type(e).__name__}: {e}"
+    return (True, "", "") if ok else (False, "", f"{service} ended in {state}")
+
+# Command prefix for systemctl: [SYSTEMCTL] or [SUDO, "-n", SYSTEMCTL].
+# Decided once (see systemctl_prefix) so each call is a single fork/exec.
+_SYSTEMCTL_CMD: List[str] = []
+_AUTH_ERRORS = (
+    "access denied",
+    "interactive authentication required",
+    "a password is required",
+    "permission denied",
+)
+
+def systemctl_prefix(refresh: bool = False) -> List[str]:
+    """root -> plain systemctl; otherwise sudo -n if it works non-interactively."""
+    global _SYSTEMCTL_CMD
+    if _SYSTEMCTL_CMD and not refresh:
+        return _SYSTEMCTL_CMD
+    cmd = [SYSTEMCTL]
+    if os.geteuid() != 0:
+        try:
+            cp = subprocess.run(
+                [SUDO, "-n", "true"],
+                capture_output=True,
+                stdin=subprocess.DEVNULL,
+                timeout=5,
+            )
+            if cp.returncode == 0:
+                cmd = [SUDO, "-n", SYSTEMCTL]
+        except Exception:
+            pass
+    _SYSTEMCTL_CMD = cmd
+    return cmd
+
+def _systemctl_once(argv: List[str]) -> Tuple[bool, str, str]:
+    # Bounded: a hung unit job must not wedge the caller forever
+    try:
+        cp = subprocess.run(
+            argv,
+            check=False,
+            capture_output=True,
+            text=True,
+            stdin=subprocess.DEVNULL,
+            timeout=SYSTEMCTL_TIMEOUT_SEC,
+        )
+        return cp.returncode == 0, (cp.stdout or "").strip(), (cp.stderr or "").strip()
+    except subprocess.TimeoutExpired:
+        return False, "", f"{' '.join(argv)} timed out after {SYSTEMCTL_TIMEOUT_SEC}s"
+    except Exception as e:
+        return False, "", f"{type(e).__name__}: {e}"
+
+def run_systemctl(args: List[str]) -> Tuple[bool, str, str]:
+    """
+    Run a systemd action; returns (ok, stdout, stderr). Never raises.
+    D-Bus first (if pystemd is available); otherwise systemctl via the cached
+    prefix (plain or sudo -n). If the call is refused for permissions, try
+    the other prefix once and keep it if it works (self-heals sudoers /
+    polkit changes at runtime).
+    """
+    global _SYSTEMCTL_CMD
+    if len(args) == 2:
+        res = _sd_unit_call(args[0], args[1])
+        if res is not None:
+            return res
+
+    cmd = systemctl_prefix()
+    ok, out, err = _systemctl_once(cmd + args)
+    if ok or not any(m in err.lower() for m in _AUTH_ERRORS):
+        return ok, out, err
+
+    other = [SYSTEMCTL] if cmd[0] == SUDO else [SUDO, "-n", SYSTEMCTL]
+    ok2, out2, err2 = _systemctl_once(other + args)
+    if ok2:
+        _SYSTEMCTL_CMD = other
+        return ok2, out2, err2
+    return False, out, err
 
 # ------------------------------------------------------------------
 # System-wide endpoints (shared across the entire system)
@@ -132,12 +453,28 @@ REG_IFACE_DEFAULT = "wlan0"
 def get_reg_iface() -> str:
     return os.getenv("REG_IFACE", REG_IFACE_DEFAULT)
 
+_MAC_CACHE: Dict[str, str] = {}  # iface -> MAC (fixed per boot)
+
 def get_mac_address(iface: str) -> str:
+    """
+    MAC from sysfs, cached per iface. Raw os.open/os.read (no TextIOWrapper).
+    A miss (iface not up yet) is not cached.
+    """
+    mac = _MAC_CACHE.get(iface)
+    if mac:
+        return mac
     try:
-        with open(f"/sys/class/net/{iface}/address") as f:
-            return f.read().strip().lower()
+        fd = os.open(f"/sys/class/net/{iface}/address", os.O_RDONLY)
+        try:
+            data = os.read(fd, 64)
+        finally:
+            os.close(fd)
+        mac = data.decode("ascii", "replace").strip().lower()
     except Exception:
         return ""
+    if mac:
+        _MAC_CACHE[iface] = mac
+    return mac
 
 # ------------------------------------------------------------------
 # Scan data
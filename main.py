@@ -1,15 +1,31 @@
 import tkinter as tk
 from tkinter import ttk
-from tkinter import messagebox
-from datetime import datetime 
+import array
+import functools
+import os
+import itertools
+import math
+import select
 import subprocess
 import threading
+import time
 import json
+import wave
+from collections import deque
 from pathlib import Path
 from config import local_ts
 from config import get_bundle_version
 import shutil
-from config import BASE_DIR, SYSTEMCTL, SUDO, SERVICE_SCANNER_POLLER
+from config import BASE_DIR, SERVICE_SCANNER_POLLER, run_systemctl
+
+# Optional: watch scanner-poller state over D-Bus (unit actions go through config.run_systemctl)
+try:
+    from pystemd.systemd1 import Unit as _SdUnit, Manager as _SdManager  # type: ignore
+    from pystemd.dbuslib import DBus as _SdBus    # type: ignore
+except Exception:
+    _SdUnit = None
+    _SdManager = None
+    _SdBus = None
 
 REGISTER_PY = BASE_DIR / "register.py"
 SCANNER_NAME_FILE = BASE_DIR / "scanner_name.txt"
@@ -19,7 +35,9 @@ LAST_REGISTER_FILE = BASE_DIR / "last_register.json"
 status_box = None              # will be created later
 startup_messages = []          # list[str], printed/logged before GUI exists
 
+@functools.lru_cache(maxsize=32)
 def _cmd_exists(cmd: str) -> bool:
+    # PATH doesn't change under the GUI; one PATH walk per tool per process
     return shutil.which(cmd) is not None
 
 def _run_cmd(cmd_list, timeout=3):
@@ -57,18 +75,55 @@ def show_status(msg: str, log: bool = True):
         startup_messages.append(msg)
         return
 
+    # Coalesce bursts: only the last message before the next idle gets drawn
+    global _pending_msg
+    first = _pending_msg is None
+    _pending_msg = msg
+    if first:
+        root.after_idle(_flush_status)
+
+_pending_msg = None            # newest message waiting for the idle flush
+_last_msg = None               # what status_box currently shows
+
+def _flush_status():
+    global _pending_msg, _last_msg
+    msg, _pending_msg = _pending_msg, None
+    if msg is None or msg == _last_msg:
+        return  # unchanged: skip the Text delete/insert relayout
+    _last_msg = msg
     status_box.config(state="normal")
     status_box.delete("1.0", tk.END)
     status_box.insert(tk.END, msg)
     status_box.config(state="disabled")
 
+def _read_proc_asound_pcm():
+    """Lines of /proc/asound/pcm (e.g. '01-00: USB Audio : ... : capture 1'), or None."""
+    try:
+        with open("/proc/asound/pcm", encoding="utf-8", errors="replace") as f:
+            return [ln.strip() for ln in f if ln.strip()]
+    except OSError:
+        return None
+
+def _append_alsa_tool_listing(lines, tool: str):
+    """Fallback when /proc/asound is missing: '<tool> -l' (arecord / aplay)."""
+    if not _cmd_exists(tool):
+        lines.append(f"Audio: {tool} not found")
+        return
+    ok, out, err = _run_cmd([tool, "-l"], timeout=3)
+    lines.append(f"Audio: {tool} -l = {'OK' if ok else 'FAIL'}")
+    if out:
+        # keep it short on the 5" screen
+        lines.extend(["  " + s for s in out.splitlines()[:6]])
+    elif err:
+        lines.append("  " + err.splitlines()[0][:120])
+
 def av_runtime_ready_probe() -> str:
     """
     LOCAL.AV.RUNTIME.READY probe.
     Fast, non-invasive checks:
       - device nodes exist
       - tools exist
-      - basic device listing via arecord/aplay
+      - basic device listing via /proc/asound/pcm (arecord/aplay fallback)
     Returns a multi-line report string.
     """
     lines = []
@@ -77,30 +132,19 @@ def av_runtime_ready_probe() -> str:
     lines.append("")
 
     # 1) Video device
-    cam_ok = Path("/dev/video0").exists()
+    cam_ok = os.path.exists("/dev/video0")
     lines.append(f"Video: /dev/video0 exists = {cam_ok}")
 
-    # 2) Audio devices listing (ALSA)
-    if _cmd_exists("arecord"):
-        ok, out, err = _run_cmd(["arecord", "-l"], timeout=3)
-        lines.append(f"Audio: arecord -l = {'OK' if ok else 'FAIL'}")
-        if out:
-            # keep it short on the 5" screen
-            lines.extend(["  " + s for s in out.splitlines()[:6]])
-        elif err:
-            lines.append("  " + err.splitlines()[0][:120])
-    else:
-        lines.append("Audio: arecord not found")
-
-    if _cmd_exists("aplay"):
-        ok, out, err = _run_cmd(["aplay", "-l"], timeout=3)
-        lines.append(f"Audio: aplay -l = {'OK' if ok else 'FAIL'}")
-        if out:
-            lines.extend(["  " + s for s in out.splitlines()[:6]])
-        elif err:
-            lines.append("  " + err.splitlines()[0][:120])
+    # 2) Audio devices listing (ALSA): /proc/asound/pcm, no arecord/aplay fork
+    pcm = _read_proc_asound_pcm()
+    if pcm is not None:
+        for kind in ("capture", "playback"):
+            devs = [ln for ln in pcm if kind in ln]
+            lines.append(f"Audio: {kind} PCMs = {'OK' if devs else 'NONE'}")
+            lines.extend(["  " + ln[:120] for ln in devs[:6]])
     else:
-        lines.append("Audio: aplay not found")
+        _append_alsa_tool_listing(lines, "arecord")
+        _append_alsa_tool_listing(lines, "aplay")
 
     # 3) Tools availability
     lines.append("")
@@ -117,29 +161,75 @@ def av_runtime_ready_probe() -> str:
 
     return "\n".join(lines)
 
+# ---- AV probe: cached briefly, run off the Tk main thread ----
+AV_PROBE_TTL_SEC = 5.0
+_av_probe_cache = {"ts": 0.0, "val": ""}
+_av_probe_lock = threading.Lock()  # one probe at a time; rapid re-clicks reuse it
+
+def av_runtime_ready_probe_cached() -> str:
+    with _av_probe_lock:
+        if _av_probe_cache["val"] and time.monotonic() - _av_probe_cache["ts"] < AV_PROBE_TTL_SEC:
+            return _av_probe_cache["val"]
+        try:
+            rep = av_runtime_ready_probe()
+        except Exception as e:
+            return f"LOCAL.AV.RUNTIME.READY failed: {e}"
+        _av_probe_cache["ts"] = time.monotonic()
+        _av_probe_cache["val"] = rep
+        return rep
+
+def _bg_av_probe(show: bool = True):
+    """Run the AV probe in a worker thread; post the report to the GUI when done."""
+    def worker():
+        rep = av_runtime_ready_probe_cached()
+        if show:
+            root.after(0, lambda: show_status(rep, log=True))
+        else:
+            root.after(0, lambda: log_records.append(rep))
+    threading.Thread(target=worker, daemon=True).start()
+
+def _write_beep_wav(path: str, freq: int = 880, sec: float = 1.0, rate: int = 48000):
+    """1-channel 16-bit sine WAV (same shape ffmpeg's lavfi sine produced)."""
+    amp = 32767 / 8  # lavfi sine default amplitude
+    n = int(rate * sec)
+    k = 2 * math.pi * freq / rate
+    buf = array.array("h", (int(amp * math.sin(k * i)) for i in range(n)))
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(buf.tobytes())
+
+# Deterministic, so generated once and kept on disk across runs/reboots
+BEEP_PATH = BASE_DIR / "assets" / "beep_880hz_1s.wav"
+BEEP_FALLBACK_PATH = Path("/tmp/beep_880hz_1s.wav")  # if assets/ isn't writable
+
+def _ensure_beep_wav() -> Path:
+    """Return a path to the beep WAV, generating it (atomically) if missing."""
+    for path in (BEEP_PATH, BEEP_FALLBACK_PATH):
+        if path.exists():
+            return path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".wav.tmp")
+            _write_beep_wav(str(tmp))
+            tmp.replace(path)
+            return path
+        except Exception:
+            continue
+    raise RuntimeError(f"cannot write {BEEP_PATH} or {BEEP_FALLBACK_PATH}")
+
 def play_test_beep():
     """
     Reliable beep:
-    1) generate a 1s WAV sine wave into /tmp
+    1) use the cached 1s WAV sine wave (generated once, in-process)
     2) play it through mpv using the known-good ALSA settings
     """
-    tmp_wav = "/tmp/beep_880hz_1s.wav"
-
-    # 1) Generate WAV using ffmpeg (no speaker needed on the host, just file gen)
-    if not _cmd_exists("ffmpeg"):
-        return False, "ffmpeg missing"
-
-    gen_cmd = [
-        "ffmpeg", "-hide_banner", "-loglevel", "error",
-        "-f", "lavfi",
-        "-i", "sine=frequency=880:duration=1",
-        "-ac", "1", "-ar", "48000",
-        "-c:a", "pcm_s16le",
-        "-y", tmp_wav
-    ]
-    ok, out, err = _run_cmd(gen_cmd, timeout=5)
-    if not ok:
-        return False, f"ffmpeg gen failed: {err or out}"
+    # 1) Cached WAV (stat only on repeat)
+    try:
+        tmp_wav = str(_ensure_beep_wav())
+    except Exception as e:
+        return False, f"beep wav gen failed: {e}"
 
     # 2) Play WAV using mpv with the same output path you confirmed works
     if not _cmd_exists("mpv"):
@@ -158,27 +248,64 @@ def play_test_beep():
 
     return True, "ok"
 
-def run_register_once():
-    """Run register.py once; do not crash GUI if it fails."""
-    try:
-        subprocess.run(
-            ["/usr/bin/python3", str(REGISTER_PY)],
-            check=False,
-            capture_output=True,
-            text=True,
-            stdin=subprocess.DEVNULL,
-            timeout=10,
-        )
-    except Exception:
-        pass
+REGISTER_TIMEOUT_SEC = 10
 
-def read_scanner_name() -> str:
+def run_register_async(on_done):
+    """
+    Run register.py once in the background; do not crash or block the GUI.
+    on_done() is called from the worker thread when it exits (or times out).
+    """
+    def worker():
+        try:
+            p = subprocess.Popen(
+                ["/usr/bin/python3", str(REGISTER_PY)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                p.wait(timeout=REGISTER_TIMEOUT_SEC)
+            except subprocess.TimeoutExpired:
+                p.kill()
+                p.wait()
+        except Exception:
+            pass
+        _clear_file_cache()
+        on_done()
+
+    threading.Thread(target=worker, daemon=True).start()
+
+# ---- stat-validated cache for file-backed status (GUI redraws re-read these) ----
+# Both files only change when register.py runs, so one os.stat per read is
+# enough: re-read/re-parse only when (st_mtime_ns, st_size) moves.
+_file_cache = {}               # key -> (stat signature, value)
+
+def _stat_cached(key: str, path: Path, loader):
+    try:
+        st = os.stat(path)
+        sig = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        sig = None
+    hit = _file_cache.get(key)
+    if hit and hit[0] == sig:
+        return hit[1]
+    value = loader()
+    _file_cache[key] = (sig, value)
+    return value
+
+def _clear_file_cache():
+    _file_cache.clear()
+
+def _read_scanner_name() -> str:
     try:
         return SCANNER_NAME_FILE.read_text(encoding="utf-8").strip()
     except Exception:
         return ""
 
-def read_register_status() -> str:
+def read_scanner_name() -> str:
+    return _stat_cached("scanner_name", SCANNER_NAME_FILE, _read_scanner_name)
+
+def _read_register_status() -> str:
     try:
         j = json.loads(LAST_REGISTER_FILE.read_text(encoding="utf-8"))
         status = j.get("status", "")
@@ -187,46 +314,75 @@ def read_register_status() -> str:
         return f"register={status} http={http_code} {detail}".strip()
     except Exception:
         return "register=unknown"
+
+def read_register_status() -> str:
+    return _stat_cached("register_status", LAST_REGISTER_FILE, _read_register_status)
     
-def _run_systemctl(args):
+# ---- scanner-poller state over D-Bus ----
+_poller_active = None          # last ActiveState seen on D-Bus (None = unknown)
+
+def _watch_poller_state(on_change):
     """
-    Run systemctl. Try without sudo first; if that fails, retry with sudo -n.
-    Returns (ok: bool, stdout: str, stderr: str)
+    Background thread: subscribe to PropertiesChanged on the scanner-poller unit
+    and call on_change(active: bool) whenever it crosses active <-> not active.
+    No-op if pystemd is missing or the bus is unreachable.
     """
-    # 1) try without sudo
-    try:
-        cp = subprocess.run(
-            [SYSTEMCTL] + args,
-            check=True,
-            capture_output=True,
-            text=True,
-            stdin=subprocess.DEVNULL,
-        )
-        return True, cp.stdout.strip(), cp.stderr.strip()
-    except subprocess.CalledProcessError as e1:
-        # 2) retry with sudo -n
+    if _SdUnit is None or _SdManager is None or _SdBus is None:
+        return
+
+    def handler(msg, error=None, userdata=None):
+        global _poller_active
         try:
-            cp2 = subprocess.run(
-                [SUDO, "-n", SYSTEMCTL] + args,
-                check=True,
-                capture_output=True,
-                text=True,
-                stdin=subprocess.DEVNULL,
-            )
-            return True, cp2.stdout.strip(), cp2.stderr.strip()
-        except subprocess.CalledProcessError as e2:
-            return False, (e2.stdout or "").strip(), (e2.stderr or e1.stderr or "").strip()
-        
+            msg.process_reply(True)
+            _iface, changed, _invalidated = msg.body
+            state = changed.get(b"ActiveState")
+            if state is None:
+                return
+            active = (state == b"active")
+            if active != _poller_active:
+                _poller_active = active
+                on_change(active)
+        except Exception:
+            pass
+
+    def worker():
+        global _poller_active
+        try:
+            unit = _SdUnit(SERVICE_SCANNER_POLLER.encode("utf-8"))
+            unit.load()
+            _poller_active = (unit.Unit.ActiveState == b"active")
+            with _SdBus() as bus:
+                # systemd only emits unit PropertiesChanged to clients that
+                # called Manager.Subscribe() (tied to this bus connection)
+                mgr = _SdManager(bus=bus)
+                mgr.load()
+                mgr.Manager.Subscribe()
+                bus.match_signal(
+                    unit.destination, unit.path,
+                    b"org.freedesktop.DBus.Properties", b"PropertiesChanged",
+                    handler, None,
+                )
+                fd = bus.get_fd()
+                while True:
+                    select.select([fd], [], [])
+                    bus.process()
+        except Exception:
+            _poller_active = None  # fall back to systemctl
+
+    threading.Thread(target=worker, daemon=True).start()
+
 def service_is_active():
-    ok, out, _ = _run_systemctl(["is-active", SERVICE_SCANNER_POLLER])
+    if _poller_active is not None:
+        return _poller_active
+    ok, out, _ = run_systemctl(["is-active", SERVICE_SCANNER_POLLER])
     # systemctl is-active returns nonzero when inactive; treat output text for truth
     return ok and out.strip() == "active"
 
 def service_start():
-    return _run_systemctl(["start", SERVICE_SCANNER_POLLER])
+    return run_systemctl(["start", SERVICE_SCANNER_POLLER])
 
 def service_stop():
-    return _run_systemctl(["stop", SERVICE_SCANNER_POLLER])
+    return run_systemctl(["stop", SERVICE_SCANNER_POLLER])
 
 def set_button_and_status(active: bool):
     """Update button label + status text based on active flag."""
@@ -272,8 +428,15 @@ def _voice_set_mode(mode: str) -> bool:
     return _voice_save_cfg(cfg)
 
 # ---- Grid functions ----
+ALERT_SHOW_MS = 3000
+
 def function00():
-    messagebox.showinfo("Information", "This is a Major Alert!")
+    # Non-modal banner (messagebox would block the Tk loop until dismissed)
+    w = tk.Toplevel(root)
+    w.title("Information")
+    w.transient(root)
+    tk.Label(w, text="This is a Major Alert!", font=("Segoe UI", 16), fg="red").pack(padx=20, pady=20)
+    root.after(ALERT_SHOW_MS, w.destroy)
     show_status("This is a Major Alert!")
 
 def function01():
@@ -301,7 +464,7 @@ def function01():
 def function02():
     # Show last 10 log messages
     if log_records:
-        last10 = log_records[-10:]
+        last10 = list(itertools.islice(reversed(log_records), 10))[::-1]
         combined = "\n".join(last10)
         show_status(combined, log=False)  # do not log "Show Log"
     else:
@@ -312,9 +475,9 @@ def function03():
     root.after(500, root.destroy)
 
 def function10():
-    # Re-run AV readiness probe and show it
-    rep = av_runtime_ready_probe()
-    show_status(rep, log=True)
+    # Re-run AV readiness probe (in background) and show it
+    show_status("AV readiness: probing...", log=False)
+    _bg_av_probe(show=True)
 
 def function13():
     ok, detail = play_test_beep()
@@ -341,20 +504,12 @@ def function20():
 def function23():
     show_status("Hello B23!")
 
-log_records = []   # will store all messages
-
-# ---- LOCAL.AV.RUNTIME.READY (run BEFORE registration) ----
-try:
-    av_report = av_runtime_ready_probe()
-    show_status(av_report, log=True)   # pre-GUI: cached into startup_messages
-except Exception as e:
-    av_report = f"LOCAL.AV.RUNTIME.READY failed: {e}"
-    show_status(av_report, log=True)
+LOG_RECORDS_MAX = 1000
+log_records = deque(maxlen=LOG_RECORDS_MAX)   # most recent messages (bounded)
 
-# ---- Registration (after AV probe) ----
-run_register_once()
-scanner_name = read_scanner_name()
-register_status = read_register_status()
+# ---- Registration: runs in background once the window exists ----
+scanner_name = read_scanner_name()       # last known identity until register.py finishes
+register_status = "register=running..."
 
 # root window
 root = tk.Tk()
@@ -377,8 +532,6 @@ status_box.config(state="disabled")  # make it read-only
 if startup_messages:
     show_status(startup_messages[-1], log=False)  # show last cached report on screen
 
-show_status(f"Scanner: {scanner_name or '(unassigned)'}\n{register_status}", log=True)
-
 # Show registration info at GUI startup
 show_status(f"Scanner: {scanner_name or '(unassigned)'}\n{register_status}", log=True)
 
@@ -395,13 +548,25 @@ style.configure(
   focuscolor='none', 
   font=("Segoe UI", 14))
 
-# ---- Buttons ----
-button00 = ttk.Button(root, text="Show Alert!", command=function00)
-button00.grid(row=0, column=0, sticky="EWNS")
-
+# ---- Buttons: (text, command, row, column) ----
+BUTTONS = [
+    ("Show Alert!",        function00, 0, 0),
+    ("Scan Channel",       function01, 0, 1),
+    ("Show Log",           function02, 0, 2),
+    ("Quit",               function03, 0, 3),
+    ("AV Readiness",       function10, 1, 0),
+    ("Beep Test",          function13, 1, 3),
+    ("Voice: Deaf/Listen", function20, 2, 0),
+    ("B23",                function23, 2, 3),
+]
+buttons = {}
+for text, cmd, r, c in BUTTONS:
+    b = ttk.Button(root, text=text, command=cmd)
+    b.grid(row=r, column=c, sticky="EWNS")
+    buttons[(r, c)] = b
+
+button01 = buttons[(0, 1)]  # Scan Channel / Stop Scan toggle
 scanningChannel = False
-button01 = ttk.Button(root, text="Scan Channel", command=function01)
-button01.grid(row=0, column=1, sticky="EWNS")
 
 # Detect actual service state at startup so UI matches reality
 try:
@@ -411,22 +576,26 @@ except Exception:
 
 set_button_and_status(scanningChannel)
 
-button02 = ttk.Button(root, text="Show Log", command=function02)
-button02.grid(row=0, column=2, sticky="EWNS")
-
-button03 = ttk.Button(root, text="Quit", command=function03)
-button03.grid(row=0, column=3, sticky="EWNS")
+def _on_poller_state(active: bool):
+    """Service changed state outside the GUI (agent, NMS command, systemd)."""
+    global scanningChannel
+    if active != scanningChannel:
+        scanningChannel = active
+        set_button_and_status(active)
 
-button10 = ttk.Button(root, text="AV Readiness", command=function10)
-button10.grid(row=1, column=0, sticky="EWNS")
+# Keep the Scan button in sync with systemd without polling systemctl
+_watch_poller_state(lambda active: root.after(0, _on_poller_state, active))
 
-button13 = ttk.Button(root, text="Beep Test", command=function13)
-button13.grid(row=1, column=3, sticky="EWNS")
+def _refresh_register_labels():
+    """register.py finished: pick up scanner_name.txt / last_register.json."""
+    global scanner_name, register_status
+    scanner_name = read_scanner_name()
+    register_status = read_register_status()
+    set_button_and_status(scanningChannel)
 
-button20 = ttk.Button(root, text="Voice: Deaf/Listen", command=function20)
-button20.grid(row=2, column=0, sticky="EWNS")
+run_register_async(lambda: root.after(0, _refresh_register_labels))
 
-button23 = ttk.Button(root, text="B23", command=function23)
-button23.grid(row=2, column=3, sticky="EWNS")
+# ---- LOCAL.AV.RUNTIME.READY (background; report goes to the log, see "Show Log") ----
+_bg_av_probe(show=False)
 
 root.mainloop()
@@ -1,14 +1,13 @@
 #!/usr/bin/env python3
 import json
+import os
 import socket
-import subprocess
 import sys
 from typing import Dict, Any
 
-import requests
-
 from config import (
     BASE_DIR,
+    HTTP_SESSION,
     get_nms_base,
     get_reg_iface,
     get_bundle_version,
@@ -94,15 +93,15 @@ def get_ip_best_effort() -> str:
     except Exception:
         pass
 
-    # 2) routing-based
+    # 2) routing-based: connect() on a UDP socket makes the kernel pick the
+    #    outbound source address; nothing is sent (no bash/ip/awk fork)
     try:
-        out = subprocess.check_output(
-            ["bash", "-lc", "ip route get 1.1.1.1 | awk '{print $7; exit}'"],
-            text=True,
-        ).strip()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("1.1.1.1", 80))
+            out = s.getsockname()[0]
         if out and not out.startswith("127."):
             return out
-    except Exception:
+    except OSError:
         pass
 
     return ""
@@ -151,7 +150,8 @@ def main() -> int:
     }
 
     try:
-        r = requests.post(url, json=body, timeout=HTTP_TIMEOUT_SEC)
+        # Same keep-alive pool as the /health discovery probe above
+        r = HTTP_SESSION.post(url, json=body, timeout=HTTP_TIMEOUT_SEC)
     except Exception as e:
         write_last_register(
             status="offline",
@@ -176,9 +176,15 @@ def main() -> int:
             return 5
 
         try:
+            # O_DSYNC: data is on the SD card before the rename makes it visible,
+            # so a power cut can't leave an empty scanner_name.txt behind
             tmp = SCANNER_NAME_FILE.with_suffix(".tmp")
-            tmp.write_text(scanner + "\n", encoding="utf-8")
-            tmp.replace(SCANNER_NAME_FILE)
+            fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DSYNC, 0o644)
+            try:
+                os.write(fd, (scanner + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+            os.replace(str(tmp), str(SCANNER_NAME_FILE))
         except Exception as e:
             write_last_register(
                 status="error",
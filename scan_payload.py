@@ -12,28 +12,78 @@ Time format MUST match NMS:
 """
 
 import json
+import os
+import time
+from collections import deque
 from typing import Any, Dict, List
 
 from config import LATEST_JSON_FILE, TIME_FMT, local_ts
 
+# Optional fast JSON parser (falls back to stdlib)
+try:
+    import orjson  # type: ignore
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Optional batching of intermediate scans: keep up to N snapshots (one per
+# distinct file mtime) and send them as payload["snapshots"]. Off (0) by
+# default: the NMS ingest endpoint must understand "snapshots" first.
+SNAPSHOTS_MAX = int(os.getenv("UPLOAD_SNAPSHOTS_MAX", "0"))
+_SNAPSHOTS: deque = deque(maxlen=max(SNAPSHOTS_MAX, 1))
+_SEEN_MTIME_NS = 0
+
 
 def _read_latest_scan_entries() -> List[Dict[str, Any]]:
     """
     Read /tmp/latest_scan.json (written by scan_wifi.sh + parse_iw.py).
     Returns [] if missing or invalid.
     """
+    # plain read, never mmap: the writers truncate this file in place
+    # (scan_wifi.sh ': >', parse_iw.py open("w")), which would SIGBUS a mapping
     try:
-        if not LATEST_JSON_FILE.exists():
-            return []
-        s = LATEST_JSON_FILE.read_text(encoding="utf-8").strip()
+        with open(LATEST_JSON_FILE, "rb") as f:
+            s = f.read().strip()
         if not s:
             return []
-        obj = json.loads(s)
+        obj = _json_loads(s)
         return obj if isinstance(obj, list) else []
     except Exception:
         return []
 
 
+def collect_snapshot() -> None:
+    """
+    Remember the current scan file if it changed since the last call.
+    No-op unless UPLOAD_SNAPSHOTS_MAX > 0.
+    """
+    global _SEEN_MTIME_NS
+    if SNAPSHOTS_MAX <= 0:
+        return
+    try:
+        mtime_ns = os.stat(LATEST_JSON_FILE).st_mtime_ns
+    except OSError:
+        return
+    if mtime_ns <= _SEEN_MTIME_NS:
+        return
+    entries = _read_latest_scan_entries()
+    if not entries:
+        return
+    _SEEN_MTIME_NS = mtime_ns
+    _SNAPSHOTS.append({
+        "time": time.strftime(TIME_FMT, time.localtime(mtime_ns / 1e9)),
+        "entries": entries,
+    })
+
+
+def clear_snapshots() -> None:
+    """Drop batched snapshots once NMS has accepted them."""
+    _SNAPSHOTS.clear()
+
+
+_TEMPLATE: Dict[str, Any] = {}  # reused envelope; static fields set once
+
+
 def build_payload(scanner: str, iface: str) -> Dict[str, Any]:
     """
     Payload contract (Pi-side):
@@ -42,11 +92,24 @@ def build_payload(scanner: str, iface: str) -> Dict[str, Any]:
     - iface: wlan0, etc
     - entries: list of AP scan dicts from parse_iw.py
     - time_format: explicit (telemetry only)
+    - snapshots: [{time, entries}, ...] since last accepted upload
+      (only when UPLOAD_SNAPSHOTS_MAX > 0)
+
+    The same dict is returned on every call (only time/entries change);
+    callers serialize it right away and must not keep or mutate it.
     """
-    return {
-        "scanner": scanner,
-        "time": local_ts(),
-        "iface": iface,
-        "entries": _read_latest_scan_entries(),
-        "time_format": TIME_FMT,
-    }
+    global _TEMPLATE
+    if _TEMPLATE.get("scanner") != scanner or _TEMPLATE.get("iface") != iface:
+        _TEMPLATE = {
+            "scanner": scanner,
+            "time": "",
+            "iface": iface,
+            "entries": [],
+            "time_format": TIME_FMT,
+        }
+    _TEMPLATE["time"] = local_ts()
+    _TEMPLATE["entries"] = _read_latest_scan_entries()
+    if SNAPSHOTS_MAX > 0:
+        collect_snapshot()
+        _TEMPLATE["snapshots"] = list(_SNAPSHOTS)
+    return _TEMPLATE
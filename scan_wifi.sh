@@ -27,7 +27,7 @@ scan_once() {
 
 if [[ "$MODE" == "loop" ]]; then
   while true; do
-    echo "---- $(date '+%F %T') ----"
+    printf -- '---- %(%F %T)T ----\n' -1   # bash builtin, no date fork
     scan_once || true
     sleep 60
   done
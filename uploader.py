@@ -1,34 +1,80 @@
 #!/usr/bin/env python3
 import os
+import gzip
 import time
 import json
+import signal
+import selectors
+import threading
 from pathlib import Path
 
 import requests
 
+# Optional fast JSON codec (falls back to stdlib)
+try:
+    import orjson  # type: ignore
+    _json_dumps = orjson.dumps
+except ImportError:
+    # compact like orjson; encoder built once instead of per dumps() call
+    _JSON_ENCODE = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    def _json_dumps(obj) -> bytes:
+        return _JSON_ENCODE(obj).encode("utf-8")
+
+# Optional: inotify wakes us the moment the scan JSON is written (else 200 ms polling)
+try:
+    from inotify_simple import INotify, flags as _in_flags  # type: ignore
+except Exception:
+    INotify = None
+
 from config import (
     BASE_DIR,
     get_nms_base,
+    invalidate_nms_cache,
+    NmsAdapter,
     SCANNER_NAME_FILE,
     LATEST_JSON_FILE,
     local_ts,   # MUST match NMS TIME_FMT
 )
+from scan_payload import SNAPSHOTS_MAX, clear_snapshots, collect_snapshot
 
 IFACE = os.getenv("IFACE", "wlan0")
 INTERVAL = int(os.getenv("UPLOAD_INTERVAL_SEC", "60"))
 WAIT_SCAN_MAX_SEC = int(os.getenv("WAIT_SCAN_MAX_SEC", "10"))
 HTTP_TIMEOUT_SEC = int(os.getenv("HTTP_TIMEOUT_SEC", "8"))
+SCANNER_CACHE_TTL_SEC = int(os.getenv("SCANNER_CACHE_TTL_SEC", "300"))
+# gzip the ingest body (Content-Encoding: gzip). Off by default: the NMS
+# ingest endpoint must decompress request bodies before this is enabled.
+UPLOAD_GZIP = os.getenv("UPLOAD_GZIP", "0") == "1"
+UPLOAD_GZIP_MIN_BYTES = 512
+SNAPSHOT_POLL_SEC = int(os.getenv("SNAPSHOT_POLL_SEC", "5"))
 
 LOG_PATH = BASE_DIR / "uploader.log"
 
+# One keep-alive session for the per-minute ingest POST.
+# No transport retries: the POST isn't idempotent (a 502 after the NMS stored
+# the payload would duplicate it); a failed upload is simply retried next cycle.
+SESSION = requests.Session()
+SESSION.headers["Content-Type"] = "application/octet-stream"
+SESSION.mount("http://", NmsAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+
+_LOG_FD = None  # O_APPEND fd kept open for the process lifetime
+
+
+def _get_log_fd() -> int:
+    global _LOG_FD
+    if _LOG_FD is None:
+        LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _LOG_FD = os.open(str(LOG_PATH), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    return _LOG_FD
+
 
 def log(msg: str) -> None:
     line = f"[{local_ts()}] {msg}"
     print(line, flush=True)
     try:
-        LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with LOG_PATH.open("a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        # one write() per line; O_APPEND keeps lines whole even if rotated/shared
+        os.write(_get_log_fd(), (line + "\n").encode("utf-8"))
     except Exception:
         pass
 
@@ -44,25 +90,104 @@ def read_scanner_name() -> str:
         return ""
 
 
+_scanner_cache = {"v": "", "t": 0.0}
+
+
+def cached_scanner_name() -> str:
+    """read_scanner_name() refreshed every SCANNER_CACHE_TTL_SEC (or after invalidation)."""
+    now = time.monotonic()
+    if not _scanner_cache["v"] or now - _scanner_cache["t"] > SCANNER_CACHE_TTL_SEC:
+        _scanner_cache["v"] = read_scanner_name()
+        _scanner_cache["t"] = now
+    return _scanner_cache["v"]
+
+
+def invalidate_scanner_name() -> None:
+    _scanner_cache["v"] = ""
+
+
 def build_payload(scanner: str):
     from scan_payload import build_payload as _build
     return _build(scanner, IFACE)
 
 
-def wait_for_scan_file(max_wait_sec: int) -> bool:
-    deadline = time.time() + max_wait_sec
-    while time.time() < deadline:
+def _scan_file_ready() -> bool:
+    # one stat() instead of exists() + stat(); a missing file raises
+    try:
+        return os.stat(LATEST_JSON_FILE).st_size > 2
+    except OSError:
+        return False
+
+
+_SCAN_WATCH = None  # INotify on LATEST_JSON_FILE.parent (lazy)
+_SCAN_SEL = None    # epoll selector with the inotify fd registered once
+
+
+def _scan_watch():
+    global _SCAN_WATCH, _SCAN_SEL
+    if _SCAN_WATCH is None and INotify is not None:
         try:
-            if LATEST_JSON_FILE.exists() and LATEST_JSON_FILE.stat().st_size > 2:
+            w = INotify()
+            w.add_watch(str(LATEST_JSON_FILE.parent), _in_flags.CLOSE_WRITE | _in_flags.MOVED_TO)
+            sel = selectors.DefaultSelector()
+            sel.register(w.fileno(), selectors.EVENT_READ)
+            _SCAN_WATCH, _SCAN_SEL = w, sel
+        except Exception:
+            _SCAN_WATCH, _SCAN_SEL = None, None
+    return _SCAN_WATCH
+
+
+def wait_for_scan_file(max_wait_sec: int) -> bool:
+    """
+    True once LATEST_JSON_FILE holds data (> 2 bytes), False after max_wait_sec.
+    With inotify the process sleeps in epoll until the parser closes the
+    file (no wakeups while idle); otherwise fall back to polling every 200 ms.
+    """
+    deadline = time.monotonic() + max_wait_sec
+    # watch first, then check: a write landing between the two is still seen
+    watch = _scan_watch()
+    if _scan_file_ready():
+        return True
+    if watch is None:
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            if _scan_file_ready():
                 return True
+        return False
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return _scan_file_ready()
+        try:
+            if not _SCAN_SEL.select(timeout=remaining):
+                continue
+            events = watch.read(timeout=0)
         except Exception:
-            pass
-        time.sleep(0.2)
-    return False
+            return _scan_file_ready()
+        if any(ev.name == LATEST_JSON_FILE.name for ev in events) and _scan_file_ready():
+            return True
+
+
+def _wait_collecting(seconds: float) -> None:
+    """
+    Sleep until the next upload. With snapshot batching on, wake every
+    SNAPSHOT_POLL_SEC to pick up scans finished in between.
+    """
+    if SNAPSHOTS_MAX <= 0:
+        _STOP.wait(seconds)
+        return
+    deadline = time.monotonic() + seconds
+    while not _STOP.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        _STOP.wait(min(remaining, SNAPSHOT_POLL_SEC))
+        collect_snapshot()
 
 
 def post_once() -> bool:
-    scanner = read_scanner_name()
+    scanner = cached_scanner_name()
     if not scanner:
         log("skip upload: scanner_name.txt missing/empty (not registered yet)")
         return False
@@ -75,25 +200,42 @@ def post_once() -> bool:
     payload = build_payload(scanner)
     url = f"{nms_base}/ingest/{scanner}"
 
-    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-    headers = {"Content-Type": "application/octet-stream"}
+    body = _json_dumps(payload)
+    data, headers = body, None
+    if UPLOAD_GZIP and len(body) >= UPLOAD_GZIP_MIN_BYTES:
+        data = gzip.compress(body, compresslevel=1)  # level 1: cheap on a Pi, still ~4-6x on JSON
+        headers = {"Content-Encoding": "gzip"}
 
     try:
-        r = requests.post(url, data=body, headers=headers, timeout=HTTP_TIMEOUT_SEC)
+        r = SESSION.post(url, data=data, headers=headers, timeout=HTTP_TIMEOUT_SEC)
         if 200 <= r.status_code < 300:
-            log(f"UPLOAD ok scanner={scanner} via={nms_base} status={r.status_code} bytes={len(body)}")
+            clear_snapshots()
+            log(f"UPLOAD ok scanner={scanner} via={nms_base} status={r.status_code} bytes={len(body)} wire={len(data)}")
             return True
         log(f"UPLOAD fail scanner={scanner} via={nms_base} status={r.status_code} body={r.text[:200]}")
+        if r.status_code in (403, 404):
+            invalidate_scanner_name()  # identity may have changed (re-registered)
         return False
     except Exception as e:
         log(f"UPLOAD exception scanner={scanner} via={nms_base}: {e}")
+        invalidate_nms_cache()  # re-probe (and maybe fail over) next time
         return False
 
 
+# Set by SIGTERM/SIGINT so systemd stop doesn't wait out the upload interval
+_STOP = threading.Event()
+
+
+def _request_stop(signum, frame) -> None:
+    _STOP.set()
+
+
 def main() -> None:
-    log(f"uploader started IFACE={IFACE} INTERVAL={INTERVAL}s")
+    log(f"uploader started IFACE={IFACE} INTERVAL={INTERVAL}s SNAPSHOTS_MAX={SNAPSHOTS_MAX}")
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
 
-    while True:
+    while not _STOP.is_set():
         try:
             if not wait_for_scan_file(WAIT_SCAN_MAX_SEC):
                 log(f"skip upload: {str(LATEST_JSON_FILE)} not ready after {WAIT_SCAN_MAX_SEC}s")
@@ -102,7 +244,9 @@ def main() -> None:
         except Exception as e:
             log(f"loop error: {type(e).__name__}: {e}")
 
-        time.sleep(INTERVAL)
+        _wait_collecting(INTERVAL)
+
+    log("uploader stopping (signal)")
 
 
 if __name__ == "__main__":
@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import time
 from voice_common import (
     read_identity, ensure_voice_config, load_voice_config, update_voice_config, validate_script
 )
@@ -33,9 +32,11 @@ def main():
     print("[SMOKE] mode set to name_listen")
 
     # start service
+    # (blocking start: returns once the start job finished, no sleep needed)
     rc, out, err = run(["sudo", "systemctl", "start", SERVICE_VOICE])
     print(f"[SMOKE] start rc={rc} err={err}")
-    time.sleep(1.0)
+    rc, out, err = run(["systemctl", "is-active", SERVICE_VOICE])
+    print(f"[SMOKE] is-active={out or err}")
 
     # stop service + deaf
     update_voice_config({"mode": "deaf"})
@@ -4,50 +4,53 @@ voice_agent_api.py (Wave-2)
 
 Pi-side executors for NMS voice commands.
 Keep all voice code under /home/pi/_RunScanner/voice.
+
+NOTE: agent.py currently defines its own exec_voice_* (shadowing the import
+of this module), so agent dispatch does not run this code; its systemctl
+calls go through config.run_systemctl instead.
 """
 
 from __future__ import annotations
 
+import os
 import subprocess
 from typing import Any, Dict, Tuple, List
 
-from voice_common import update_voice_config, validate_script
+from voice_common import update_voice_config, validate_script, voice_config_transaction
 
 
 SERVICE_VOICE = "scanner-voice.service"
 SYSTEMCTL = "/bin/systemctl"
 
 
+# Which prefix worked last; root needs no sudo, otherwise try sudo -n first
+# (agent runs with sudo-nopasswd) so the happy path is a single fork.
+_USE_SUDO = os.geteuid() != 0
+
+
 def _run_systemctl(args: List[str]) -> Tuple[bool, str]:
     """
-    Best-effort systemctl. We assume agent already has sudo-nopasswd,
-    but still try non-sudo first.
+    Best-effort systemctl (blocks until the job finishes, so a failed
+    start is reported). Tries the prefix that worked last, then the other one.
     """
-    # 1) without sudo
-    try:
-        cp = subprocess.run(
-            [SYSTEMCTL] + args,
-            check=True,
-            capture_output=True,
-            text=True,
-            stdin=subprocess.DEVNULL,
-            timeout=8,
-        )
-        return True, (cp.stdout or "").strip() or "ok"
-    except Exception as e1:
-        # 2) sudo -n
+    global _USE_SUDO
+    errors: List[str] = []
+    for use_sudo in (_USE_SUDO, not _USE_SUDO):
+        cmd = (["/usr/bin/sudo", "-n"] if use_sudo else []) + [SYSTEMCTL] + args
         try:
-            cp2 = subprocess.run(
-                ["/usr/bin/sudo", "-n", SYSTEMCTL] + args,
+            cp = subprocess.run(
+                cmd,
                 check=True,
                 capture_output=True,
                 text=True,
                 stdin=subprocess.DEVNULL,
                 timeout=8,
             )
-            return True, (cp2.stdout or "").strip() or "ok"
-        except Exception as e2:
-            return False, f"systemctl failed: {type(e2).__name__}: {e2} (first={type(e1).__name__}: {e1})"
+            _USE_SUDO = use_sudo
+            return True, (cp.stdout or "").strip() or "ok"
+        except Exception as e:
+            errors.append(f"{'sudo' if use_sudo else 'plain'}={type(e).__name__}: {e}")
+    return False, "systemctl failed: " + "; ".join(errors)
 
 
 def exec_voice_start(args: Dict[str, Any]) -> Tuple[bool, str]:
@@ -61,35 +64,35 @@ def exec_voice_start(args: Dict[str, Any]) -> Tuple[bool, str]:
     if mode not in ("deaf", "name_listen"):
         mode = "name_listen"
 
-    patch: Dict[str, Any] = {"mode": mode}
-
-    # timeouts
-    if "conversation_timeout_sec" in args:
-        patch["conversation_timeout_sec"] = int(args.get("conversation_timeout_sec") or 20)
-    if "llm_timeout_sec" in args:
-        patch["llm_timeout_sec"] = int(args.get("llm_timeout_sec") or 30)
-
-    # STT config (optional)
-    for k in ("stt_engine", "vosk_model_dir", "mic_dev"):
-        if k in args and str(args.get(k) or "").strip():
-            patch[k] = str(args.get(k)).strip()
-    for k in ("sample_rate", "channels", "chunk_sec"):
-        if k in args and args.get(k) is not None:
-            patch[k] = int(args.get(k))
-
-    # TTS / spoken prompts (optional)
-    # (voice_service.py will read these if present)
-    for k in (
-        "tts_volume",
-        "say_enter_name_listen",
-        "say_enter_deaf",
-        "say_enter_conversation",
-        "say_enter_llm",
-    ):
-        if k in args and args.get(k) is not None:
-            patch[k] = args.get(k)
-
-    update_voice_config(patch)
+    # one config read + one write for all fields below
+    with voice_config_transaction() as cfg:
+        cfg["mode"] = mode
+
+        # timeouts
+        if "conversation_timeout_sec" in args:
+            cfg["conversation_timeout_sec"] = int(args.get("conversation_timeout_sec") or 20)
+        if "llm_timeout_sec" in args:
+            cfg["llm_timeout_sec"] = int(args.get("llm_timeout_sec") or 30)
+
+        # STT config (optional)
+        for k in ("stt_engine", "vosk_model_dir", "mic_dev"):
+            if k in args and str(args.get(k) or "").strip():
+                cfg[k] = str(args.get(k)).strip()
+        for k in ("sample_rate", "channels", "chunk_sec"):
+            if k in args and args.get(k) is not None:
+                cfg[k] = int(args.get(k))
+
+        # TTS / spoken prompts (optional)
+        # (voice_service.py will read these if present)
+        for k in (
+            "tts_volume",
+            "say_enter_name_listen",
+            "say_enter_deaf",
+            "say_enter_conversation",
+            "say_enter_llm",
+        ):
+            if k in args and args.get(k) is not None:
+                cfg[k] = args.get(k)
 
     ok, detail = _run_systemctl(["start", SERVICE_VOICE])
     return (ok, f"voice.start: mode={mode} {detail}")
@@ -8,15 +8,57 @@ Keeps *all* Wave-2 voice files under /home/pi/_RunScanner/voice
 
 from __future__ import annotations
 
+import atexit
+import contextlib
+import functools
 import json
+import os
+import queue
+import selectors
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 import re
 from difflib import SequenceMatcher
 
+# Optional fast JSON codec (falls back to stdlib)
+try:
+    import orjson  # type: ignore
+    _json_loads = orjson.loads
+    def _json_dumps_pretty(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps_pretty(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+# Optional C++ fuzzy matcher (falls back to difflib)
+try:
+    from rapidfuzz import fuzz as _rf_fuzz, process as _rf_process  # type: ignore
+except ImportError:
+    _rf_fuzz = None
+    _rf_process = None
+
+# process.cdist returns a numpy array; plain `pip install rapidfuzz` does not
+# pull numpy in, so the batched path is only used when numpy is importable
+try:
+    import numpy  # type: ignore  # noqa: F401
+    _HAVE_NUMPY = True
+except ImportError:
+    _HAVE_NUMPY = False
+
+# Optional: inotify lets deaf mode sleep until voice_config.json changes (else 0.5 s polling)
+try:
+    from inotify_simple import INotify, flags as _in_flags  # type: ignore
+except Exception:
+    INotify = None
+
 CALLSIGN_MIN_RATIO = 0.82   # stricter (prevents alpha<->bravo)
 PREFIX_MIN_RATIO   = 0.70   # looser (twin/scout can be misheard a bit)
 ALLOW_CALLSIGN_ONLY = True
+WAKE_PREFIXES = ("twin", "scout")  # already normalized
 
 # Paths
 BASE_DIR = Path("/home/pi/_RunScanner")
@@ -32,31 +74,93 @@ DEFAULT_CFG: Dict[str, Any] = {
     "script": [],
 }
 
+_TS_CACHE = (-1, "")  # (epoch second, formatted string)
+
 def local_ts() -> str:
-    import time
-    return time.strftime("%Y-%m-%d-%H:%M:%S", time.localtime())
+    """
+    1s resolution, so format once per second and reuse the string.
+    """
+    global _TS_CACHE
+    sec = int(time.time())
+    if sec == _TS_CACHE[0]:
+        return _TS_CACHE[1]
+    ts = time.strftime("%Y-%m-%d-%H:%M:%S", time.localtime(sec))
+    _TS_CACHE = (sec, ts)
+    return ts
+
+_IDENT_CACHE: Tuple[int, str] = (-1, "")  # (st_mtime_ns, identity)
 
 def read_identity() -> str:
     """
     Identity is the calling name stored in scanner_name.txt.
     Example: twin-scout-alpha
+    Re-read only when the file's mtime changes (re-register rewrites it).
     """
+    global _IDENT_CACHE
     p = BASE_DIR / "scanner_name.txt"
     try:
-        return p.read_text(encoding="utf-8").strip()
+        mtime_ns = os.stat(p).st_mtime_ns
+        if mtime_ns == _IDENT_CACHE[0]:
+            return _IDENT_CACHE[1]
+        ident = p.read_text(encoding="utf-8").strip()
+        _IDENT_CACHE = (mtime_ns, ident)
+        return ident
     except Exception:
         return ""
 
+# voice_log only enqueues; one daemon thread owns the (kept-open) log file.
+_LOG_QUEUE: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+_LOG_THREAD: threading.Thread | None = None
+_LOG_LOCK = threading.Lock()
+
+def _log_writer() -> None:
+    f = None
+    while True:
+        line = _LOG_QUEUE.get()
+        if line is None:
+            break
+        try:
+            if f is None:
+                VOICE_DIR.mkdir(parents=True, exist_ok=True)
+                f = VOICE_LOG_FILE.open("a", encoding="utf-8", buffering=1)
+            f.write(line + "\n")
+        except Exception:
+            if f is not None:
+                try:
+                    f.close()  # don't leak an fd per I/O error
+                except Exception:
+                    pass
+            f = None
+    if f is not None:
+        try:
+            f.close()
+        except Exception:
+            pass
+
+def _flush_voice_log() -> None:
+    """atexit: let the writer drain what is queued, then stop."""
+    t = _LOG_THREAD
+    if t is not None and t.is_alive():
+        _LOG_QUEUE.put(None)
+        t.join(timeout=2.0)
+
+def _ensure_log_thread() -> None:
+    global _LOG_THREAD
+    if _LOG_THREAD is not None:
+        return
+    with _LOG_LOCK:
+        if _LOG_THREAD is None:
+            t = threading.Thread(target=_log_writer, name="voice-log", daemon=True)
+            t.start()
+            atexit.register(_flush_voice_log)
+            _LOG_THREAD = t
+
 def voice_log(msg: str, *, also_print: bool = True) -> None:
     line = f"[{local_ts()}] {msg}"
     if also_print:
         print(line, flush=True)
-    try:
-        VOICE_DIR.mkdir(parents=True, exist_ok=True)
-        with VOICE_LOG_FILE.open("a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
+    _ensure_log_thread()
+    _LOG_QUEUE.put_nowait(line)
 
 def ensure_voice_config() -> None:
     """
@@ -72,21 +176,42 @@ def ensure_voice_config() -> None:
 
     save_voice_config(DEFAULT_CFG)
 
+_CFG_CACHE: Tuple[Tuple[int, int, int], Dict[str, Any]] | None = None  # ((mtime_ns, size, ino), cfg)
+_CFG_BYTES = b""  # last bytes save_voice_config wrote
+
+def _stat_key() -> Tuple[int, int, int] | None:
+    # inode too: every save is tmp+replace, so a rewrite is caught even when
+    # the filesystem's mtime tick is coarse and the size did not change
+    try:
+        st = os.stat(VOICE_CFG_FILE)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+    except OSError:
+        return None
+
 def load_voice_config() -> Dict[str, Any]:
     """
     Load config from voice_config.json.
     If missing or corrupted, create defaults.
+    Parsed dict is cached until the file's (mtime_ns, size, inode) changes;
+    callers get a shallow copy.
     """
+    global _CFG_CACHE
+    key = _stat_key()
+    if key is not None and _CFG_CACHE is not None and _CFG_CACHE[0] == key:
+        return dict(_CFG_CACHE[1])
+
     ensure_voice_config()
     try:
-        obj = json.loads(VOICE_CFG_FILE.read_text(encoding="utf-8"))
+        obj = _json_loads(VOICE_CFG_FILE.read_bytes())
         if isinstance(obj, dict):
             # overlay defaults to ensure keys exist
             out = dict(DEFAULT_CFG)
             out.update(obj)
             # ensure types
             out["script"] = out.get("script") if isinstance(out.get("script"), list) else []
-            return out
+            key = _stat_key()
+            _CFG_CACHE = (key, out) if key is not None else None
+            return dict(out)
     except Exception:
         pass
 
@@ -98,6 +223,7 @@ def save_voice_config(cfg: Dict[str, Any]) -> None:
     """
     Atomic write config to voice_config.json.
     """
+    global _CFG_CACHE, _CFG_BYTES
     ensure_voice_config()
     out = dict(DEFAULT_CFG)
     out.update(cfg or {})
@@ -106,17 +232,82 @@ def save_voice_config(cfg: Dict[str, Any]) -> None:
     if not isinstance(out.get("script"), list):
         out["script"] = []
 
+    data = _json_dumps_pretty(out)
+    # Same bytes as our last write and nobody touched the file since: no-op
+    if data == _CFG_BYTES and _CFG_CACHE is not None and _CFG_CACHE[0] == _stat_key():
+        return
+
     tmp = VOICE_CFG_FILE.with_suffix(".json.tmp")
-    tmp.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.write_bytes(data)
     tmp.replace(VOICE_CFG_FILE)
 
+    # seed the cache from what we just wrote (no re-read on next load)
+    key = _stat_key()
+    _CFG_CACHE = (key, out) if key is not None else None
+    _CFG_BYTES = data if key is not None else b""
+
+_CFG_WATCH = None  # INotify on VOICE_CFG_FILE.parent (lazy)
+_CFG_SEL = None    # selector with the inotify fd registered once
+CFG_POLL_SEC = 0.5
+
+def _cfg_watch():
+    global _CFG_WATCH, _CFG_SEL
+    if _CFG_WATCH is None and INotify is not None:
+        try:
+            w = INotify()
+            # tmp+replace saves show up as MOVED_TO; in-place editors as CLOSE_WRITE
+            w.add_watch(str(VOICE_CFG_FILE.parent), _in_flags.CLOSE_WRITE | _in_flags.MOVED_TO)
+            sel = selectors.DefaultSelector()
+            sel.register(w.fileno(), selectors.EVENT_READ)
+            _CFG_WATCH, _CFG_SEL = w, sel
+        except Exception:
+            _CFG_WATCH, _CFG_SEL = None, None
+    return _CFG_WATCH
+
+def wait_voice_config_change(timeout_sec: float) -> bool:
+    """
+    Block until voice_config.json is rewritten or timeout_sec passes.
+    True if a change was seen. Without inotify, sleep CFG_POLL_SEC and
+    return False (caller just re-reads the config, as before).
+    """
+    watch = _cfg_watch()
+    if watch is None:
+        time.sleep(min(CFG_POLL_SEC, max(0.0, timeout_sec)))
+        return False
+
+    deadline = time.monotonic() + timeout_sec
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            if not _CFG_SEL.select(timeout=remaining):
+                continue
+            events = watch.read(timeout=0)
+        except Exception:
+            time.sleep(min(CFG_POLL_SEC, remaining))
+            return False
+        if any(ev.name == VOICE_CFG_FILE.name for ev in events):
+            return True
+
+@contextlib.contextmanager
+def voice_config_transaction() -> Iterator[Dict[str, Any]]:
+    """
+    Batch several edits into one read (cached) and one write:
+        with voice_config_transaction() as cfg:
+            cfg["mode"] = "name_listen"
+    Nothing is written if the block raises.
+    """
+    cfg = load_voice_config()
+    yield cfg
+    save_voice_config(cfg)
+
 def update_voice_config(patch: Dict[str, Any]) -> Dict[str, Any]:
     """
     Read-modify-write update (returns new cfg).
     """
-    cur = load_voice_config()
-    cur.update(patch or {})
-    save_voice_config(cur)
+    with voice_config_transaction() as cur:
+        cur.update(patch or {})
     return cur
 
 def validate_script(commands: Any) -> List[Dict[str, Any]]:
@@ -140,7 +331,50 @@ def validate_script(commands: Any) -> List[Dict[str, Any]]:
         out.append({"phrase": phrase, "reply": reply, "action": action})
     return out
 
+# (script list object, [(phrase, phrase_norm, reply, action), ...])
+_SCRIPT_COMPILED: Tuple[Any, List[Tuple[str, str, str, str]]] = (None, [])
+
+def compile_script(script: Any) -> List[Tuple[str, str, str, str]]:
+    """
+    Pre-normalize script phrases once for the per-utterance match loop.
+    Returns [(phrase, phrase_norm, reply, action), ...] for usable entries.
+    Reused while the same list object is passed in (load_voice_config hands
+    out the cached list until the file changes).
+    """
+    global _SCRIPT_COMPILED
+    if script is _SCRIPT_COMPILED[0]:
+        return _SCRIPT_COMPILED[1]
+
+    out: List[Tuple[str, str, str, str]] = []
+    for item in script if isinstance(script, list) else []:
+        if not isinstance(item, dict):
+            continue
+        phrase = str(item.get("phrase") or "").strip()
+        if not phrase:
+            continue
+        reply = str(item.get("reply") or "").strip()
+        action = str(item.get("action") or "").strip()
+        out.append((phrase, normalize_text(phrase), reply, action))
+
+    _SCRIPT_COMPILED = (script, out)
+    return out
+
 # --- Fuzzy matching helpers (no extra deps) -------------------------------
+# Canonicalize common recognition variants
+_CANON = {
+    "twins": "twin",
+    "skull": "scout",
+    "alfa": "alpha",
+    "bravo": "bravo",
+    "alpha": "alpha",
+}
+# ASCII chars other than [a-z0-9 ] -> space (after lower()); done in C
+_NORM_TABLE = str.maketrans({
+    chr(c): " " for c in range(128)
+    if not (chr(c).isdigit() or "a" <= chr(c) <= "z" or chr(c) == " ")
+})
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9 ]+")  # only needed for non-ASCII input
+
 def normalize_text(s: str) -> str:
     """
     Normalize text for fuzzy matching:
@@ -150,31 +384,27 @@ def normalize_text(s: str) -> str:
     - collapse whitespace
     - canonicalize common Vosk confusions (twins->twin, skull->scout, alfa->alpha)
     """
-    s = (s or "").lower().replace("-", " ").replace("_", " ")
-    s = re.sub(r"[^a-z0-9 ]+", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-
-    if not s:
-        return ""
-
-    # Canonicalize common recognition variants
-    canon = {
-        "twins": "twin",
-        "skull": "scout",
-        "alfa": "alpha",
-        "bravo": "bravo",
-        "alpha": "alpha",
-    }
-
-    toks = []
-    for t in s.split():
-        toks.append(canon.get(t, t))
-    return " ".join(toks)
+    s = (s or "").lower().translate(_NORM_TABLE)
+    if not s.isascii():
+        s = _NON_ALNUM_RE.sub(" ", s)
+    return " ".join([_CANON.get(t, t) for t in s.split()])
 
 def _ratio(a: str, b: str) -> float:
+    if _rf_fuzz is not None:
+        return _rf_fuzz.ratio(a, b) / 100.0
     return SequenceMatcher(None, a, b).ratio()
 
+def _best_ratio(token: str, options: List[str]) -> float:
+    """Highest _ratio(token, o) over options (0.0 if none)."""
+    if _rf_process is not None:
+        hit = _rf_process.extractOne(token, options, scorer=_rf_fuzz.ratio)
+        return hit[1] / 100.0 if hit else 0.0
+    return max((_ratio(token, o) for o in options), default=0.0)
+
 def best_token_match(token: str, options: List[str]) -> Tuple[str, float]:
+    if _rf_process is not None:
+        hit = _rf_process.extractOne(token, options, scorer=_rf_fuzz.ratio)
+        return (hit[0], hit[1] / 100.0) if hit and hit[1] > 0 else ("", 0.0)
     best = ("", 0.0)
     for o in options:
         r = _ratio(token, o)
@@ -182,32 +412,60 @@ def best_token_match(token: str, options: List[str]) -> Tuple[str, float]:
             best = (o, r)
     return best
 
-def match_wake_name(text_norm: str, *, callsign: str) -> Tuple[bool, str]:
+@functools.lru_cache(maxsize=512)
+def _prefix_ratio(token: str) -> float:
+    """Best ratio of token vs WAKE_PREFIXES (STT repeats the same words a lot)."""
+    return _best_ratio(token, WAKE_PREFIXES)
+
+@dataclass(frozen=True)
+class WakeIndex:
+    callsign: str                     # normalized callsign, e.g. "alpha"
+    ratio: Callable[[str], float]     # token -> ratio vs callsign (memoized)
+
+@functools.lru_cache(maxsize=16)
+def build_wake_index(callsign: str) -> WakeIndex:
+    """
+    Per-callsign wake matcher state, built once (and reused per callsign).
+    STT keeps producing the same words, so token ratios are memoized.
+    """
+    cs = normalize_text(callsign)
+
+    @functools.lru_cache(maxsize=512)
+    def _cs_ratio(token: str) -> float:
+        return _ratio(token, cs) if cs else 0.0
+
+    return WakeIndex(callsign=cs, ratio=_cs_ratio)
+
+def match_wake_name(
+    text_norm: str,
+    *,
+    callsign: str = "",
+    wake_index: WakeIndex | None = None,
+) -> Tuple[bool, str]:
     """
     Decide if text contains this robot's wake name:
       twin-scout-<callsign>
     Rules:
       - callsign must match strongly (min CALLSIGN_MIN_RATIO)
       - plus at least one of 'twin'/'scout' present (min PREFIX_MIN_RATIO)
+    Pass wake_index (build_wake_index) from loops; callsign= still works.
     """
     toks = text_norm.split()
     if not toks:
         return False, "no tokens"
+    if wake_index is None:
+        wake_index = build_wake_index(callsign)
 
     # 1) callsign strong match somewhere in tokens
-    cs_best = ("", 0.0)
-    for t in toks:
-        o, r = best_token_match(t, [callsign])
-        if r > cs_best[1]:
-            cs_best = (o, r)
-    if cs_best[1] < CALLSIGN_MIN_RATIO:
-        return False, f"callsign_no (best={cs_best[1]:.2f})"
+    cs_best = max(wake_index.ratio(t) for t in toks)
+    if cs_best < CALLSIGN_MIN_RATIO:
+        return False, f"callsign_no (best={cs_best:.2f})"
 
     # 2) require at least one prefix token
     prefix_ok = False
     for t in toks:
         # allow either token to satisfy
-        if max(_ratio(t, "twin"), _ratio(t, "scout")) >= PREFIX_MIN_RATIO:
+        if _prefix_ratio(t) >= PREFIX_MIN_RATIO:
             prefix_ok = True
             break
     if prefix_ok:
@@ -218,15 +476,22 @@ def match_wake_name(text_norm: str, *, callsign: str) -> Tuple[bool, str]:
 
     return False, "prefix_no"
 
+# Defaults shared by fuzzy_match and fuzzy_match_many (keep both paths in step)
+FUZZY_TOKEN_CUTOFF = 0.80
+FUZZY_FIRST_TOKEN_CUTOFF = 0.85
+FUZZY_LAST_TOKEN_CUTOFF = 0.90
+FUZZY_MIN_HIT = 3
+FUZZY_REQUIRE_LAST_TOKEN = True
+
 def fuzzy_match(
     text_norm: str,
     target: str,
     *,
-    token_cutoff: float = 0.80,
-    first_token_cutoff: float = 0.85,
-    last_token_cutoff: float = 0.90,
-    min_hit: int = 3,
-    require_last_token: bool = True,
+    token_cutoff: float = FUZZY_TOKEN_CUTOFF,
+    first_token_cutoff: float = FUZZY_FIRST_TOKEN_CUTOFF,
+    last_token_cutoff: float = FUZZY_LAST_TOKEN_CUTOFF,
+    min_hit: int = FUZZY_MIN_HIT,
+    require_last_token: bool = FUZZY_REQUIRE_LAST_TOKEN,
 ) -> Tuple[bool, float]:
     """
     Fuzzy match normalized STT text against one target name.
@@ -244,33 +509,99 @@ def fuzzy_match(
     if not text_tokens or not target_tokens:
         return False, 0.0
 
-    hits = 0
-    score_sum = 0.0
-
-    for i, tt in enumerate(target_tokens):
-        best = 0.0
-        for st in text_tokens:
-            r = _ratio(tt, st)
-            if r > best:
-                best = r
+    return _score_target(
+        len(target_tokens),
+        lambda i: _best_ratio(target_tokens[i], text_tokens),
+        token_cutoff=token_cutoff,
+        first_token_cutoff=first_token_cutoff,
+        last_token_cutoff=last_token_cutoff,
+        min_hit=min_hit,
+        require_last_token=require_last_token,
+    )
+
+def _score_target(
+    n: int,
+    best_of: Callable[[int], float],
+    *,
+    token_cutoff: float,
+    first_token_cutoff: float,
+    last_token_cutoff: float,
+    min_hit: int,
+    require_last_token: bool,
+) -> Tuple[bool, float]:
+    """
+    Shared scoring for fuzzy_match / fuzzy_match_many.
+    best_of(i) = best ratio of target token i against the text tokens.
+    """
+    if min_hit > n:
+        return False, 0.0
 
+    def _cutoff(i: int) -> float:
         # Position-aware thresholds
         if i == 0:  # brand token: "kirox"
-            cutoff = first_token_cutoff
-        elif i == len(target_tokens) - 1:  # discriminator: "alpha"
-            cutoff = last_token_cutoff
-        else:
-            cutoff = token_cutoff
-
-        if best >= cutoff:
-            hits += 1
-            score_sum += best
-        elif require_last_token and i == len(target_tokens) - 1:
+            return first_token_cutoff
+        if i == n - 1:  # discriminator: "alpha"
+            return last_token_cutoff
+        return token_cutoff
+
+    # Last (discriminator) token first: most non-matching utterances fail
+    # there, so the other tokens are never scored.
+    hit_scores: Dict[int, float] = {}
+    for done, i in enumerate([n - 1] + list(range(n - 1)), start=1):
+        best = best_of(i)
+        if best >= _cutoff(i):
+            hit_scores[i] = best
+        elif require_last_token and i == n - 1:
             # last token is mandatory
             return False, 0.0
+        if len(hit_scores) + (n - done) < min_hit:
+            return False, 0.0
 
+    hits = len(hit_scores)
     if hits < min_hit:
         return False, 0.0
 
+    # sum in target order (same float result as a front-to-back scan)
+    score_sum = sum(hit_scores[i] for i in sorted(hit_scores))
     avg_score = score_sum / hits
     return True, avg_score
+
+def fuzzy_match_many(
+    text_norm: str,
+    targets: List[str],
+    *,
+    token_cutoff: float = FUZZY_TOKEN_CUTOFF,
+    first_token_cutoff: float = FUZZY_FIRST_TOKEN_CUTOFF,
+    last_token_cutoff: float = FUZZY_LAST_TOKEN_CUTOFF,
+    min_hit: int = FUZZY_MIN_HIT,
+    require_last_token: bool = FUZZY_REQUIRE_LAST_TOKEN,
+) -> List[Tuple[bool, float]]:
+    """
+    fuzzy_match(text_norm, t, ...) for every t in targets.
+    With rapidfuzz + numpy, all (text token x target token) ratios come from
+    one process.cdist call (C++, one matrix) instead of per-pair Python calls;
+    otherwise each target is scored by fuzzy_match (rapidfuzz ratio or difflib).
+    """
+    text_tokens = text_norm.split()
+    target_tokens = [t.split() for t in targets]
+    flat = [tok for toks in target_tokens for tok in toks]
+    kw = dict(token_cutoff=token_cutoff, first_token_cutoff=first_token_cutoff,
+              last_token_cutoff=last_token_cutoff, min_hit=min_hit,
+              require_last_token=require_last_token)
+    if _rf_process is None or not _HAVE_NUMPY or not text_tokens or not flat:
+        return [fuzzy_match(text_norm, t, **kw) for t in targets]
+
+    # column max = best ratio of each flat target token over the text tokens
+    col_best = (_rf_process.cdist(text_tokens, flat, scorer=_rf_fuzz.ratio).max(axis=0) / 100.0).tolist()
+
+    out: List[Tuple[bool, float]] = []
+    off = 0
+    for toks in target_tokens:
+        n = len(toks)
+        if n == 0:
+            out.append((False, 0.0))
+            continue
+        bests = col_best[off:off + n]
+        off += n
+        out.append(_score_target(n, bests.__getitem__, **kw))
+    return out
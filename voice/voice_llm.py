@@ -2,18 +2,39 @@
 from __future__ import annotations
 
 import json
-import time
+import os
+from dataclasses import dataclass
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from typing import Any, Dict, Tuple, Optional
-from voice_common import voice_log, load_voice_config
-import re
-
-_ID_SAFE_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+from voice_common import voice_log, load_voice_config, local_ts
+import string
+
+# Optional fast JSON codec (falls back to stdlib)
+try:
+    import orjson  # type: ignore
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# [A-Za-z0-9_-] -> deleted; an id is safe if nothing is left over
+_ID_STRIP = str.maketrans("", "", string.ascii_letters + string.digits + "_-")
 LLM_STATE_PATH = Path("/home/pi/_RunScanner/voice/llm_state.json")
 
+# One pooled session: TCP + TLS to the LLM endpoint is reused across turns.
+_SESSION = requests.Session()
+_SESSION.headers["Content-Type"] = "application/json"
+_SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
+
+_KEY_CACHE: Tuple[str, int, str] = ("", 0, "")  # (path, mtime_ns, key)
+
 def _now_ts() -> str:
-    return time.strftime("%Y-%m-%d-%H:%M:%S", time.localtime())
+    return local_ts()  # same format, formatted once per second
 
 def _read_text_file(p: Path) -> str:
     try:
@@ -21,10 +42,23 @@ def _read_text_file(p: Path) -> str:
     except Exception:
         return ""
 
+def _read_api_key(path: str) -> str:
+    """API key file contents, re-read only when the file's mtime changes."""
+    global _KEY_CACHE
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return ""
+    if _KEY_CACHE[0] == path and _KEY_CACHE[1] == mtime_ns:
+        return _KEY_CACHE[2]
+    key = _read_text_file(Path(path))
+    _KEY_CACHE = (path, mtime_ns, key)
+    return key
+
 def _load_state() -> Dict[str, Any]:
     try:
         if LLM_STATE_PATH.exists():
-            return json.loads(LLM_STATE_PATH.read_text(encoding="utf-8") or "{}")
+            return _json_loads(LLM_STATE_PATH.read_bytes() or b"{}")
     except Exception:
         pass
     return {}
@@ -32,7 +66,7 @@ def _load_state() -> Dict[str, Any]:
 def _save_state(state: Dict[str, Any]) -> None:
     try:
         tmp = LLM_STATE_PATH.with_suffix(".tmp")
-        tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.write_bytes(_json_dumps(state))  # machine-only state: compact
         tmp.replace(LLM_STATE_PATH)
     except Exception:
         pass
@@ -42,17 +76,15 @@ def _extract_output_text(resp_json: Dict[str, Any]) -> str:
     Responses API returns 'output' array with content blocks.
     We'll collect any text chunks.
     """
-    out = []
-    for item in (resp_json.get("output") or []):
-        for c in (item.get("content") or []):
-            if c.get("type") == "output_text":
-                t = (c.get("text") or "").strip()
-                if t:
-                    out.append(t)
-    return "\n".join(out).strip()
+    return "\n".join(
+        t
+        for item in (resp_json.get("output") or ())
+        for c in (item.get("content") or ())
+        if c.get("type") == "output_text" and (t := (c.get("text") or "").strip())
+    )
 
 def _id_is_safe(s: str) -> bool:
-    return bool(s) and bool(_ID_SAFE_RE.match(s))
+    return bool(s) and not s.translate(_ID_STRIP)
 
 def _pick_session_id(llm_cfg: Dict[str, Any]) -> str:
     # Backward/forward compatible with your config naming
@@ -61,6 +93,36 @@ def _pick_session_id(llm_cfg: Dict[str, Any]) -> str:
         sid = str(llm_cfg.get("conversation_id") or "").strip()
     return sid
 
+@dataclass(frozen=True)
+class LlmSettings:
+    base_url: str
+    model: str
+    api_key_file: str
+    timeout_sec: int
+    max_out: int
+    temperature: float
+    session_id: str
+
+# (llm config dict, parsed settings). load_voice_config hands out the same
+# nested "llm" dict until voice_config.json changes, so parse once per change.
+_LLM_SETTINGS: Tuple[Any, Optional[LlmSettings]] = (None, None)
+
+def _llm_settings(llm: Dict[str, Any]) -> LlmSettings:
+    global _LLM_SETTINGS
+    if llm is _LLM_SETTINGS[0] and _LLM_SETTINGS[1] is not None:
+        return _LLM_SETTINGS[1]
+    st = LlmSettings(
+        base_url=str(llm.get("base_url") or "https://api.openai.com/v1/responses").strip(),
+        model=str(llm.get("model") or "").strip(),
+        api_key_file=str(llm.get("api_key_file") or "").strip(),
+        timeout_sec=int(llm.get("timeout_sec") or 30),
+        max_out=int(llm.get("max_output_tokens") or 300),
+        temperature=float(llm.get("temperature") or 0.4),
+        session_id=_pick_session_id(llm),
+    )
+    _LLM_SETTINGS = (llm, st)
+    return st
+
 def llm_exchange(user_text: str) -> Tuple[bool, str]:
     """
     Returns (ok, assistant_text_or_error)
@@ -69,24 +131,17 @@ def llm_exchange(user_text: str) -> Tuple[bool, str]:
     if not user_text:
         return True, ""
 
-    cfg = load_voice_config()
-    llm = cfg.get("llm") or {}
-
-    base_url = str(llm.get("base_url") or "https://api.openai.com/v1/responses").strip()
-    model = str(llm.get("model") or "").strip()
-    api_key_file = str(llm.get("api_key_file") or "").strip()
-    timeout_sec = int(llm.get("timeout_sec") or 30)
-    max_out = int(llm.get("max_output_tokens") or 300)
-    temperature = float(llm.get("temperature") or 0.4)
-
-    session_id = _pick_session_id(llm)
+    st = _llm_settings(load_voice_config().get("llm") or {})
+    base_url, model, api_key_file = st.base_url, st.model, st.api_key_file
+    timeout_sec, max_out, temperature = st.timeout_sec, st.max_out, st.temperature
+    session_id = st.session_id
 
     if not model:
         return False, "LLM config missing: llm.model"
     if not api_key_file:
         return False, "LLM config missing: llm.api_key_file"
 
-    key = _read_text_file(Path(api_key_file))
+    key = _read_api_key(api_key_file)
     if not key:
         return False, f"LLM key file empty: {api_key_file}"
 
@@ -120,13 +175,10 @@ def llm_exchange(user_text: str) -> Tuple[bool, str]:
         if session_id:
             payload["metadata"] = {"session_id": session_id}
 
-        headers = {
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json",
-        }
+        headers = {"Authorization": f"Bearer {key}"}
 
         try:
-            r = requests.post(base_url, headers=headers, json=payload, timeout=timeout_sec)
+            r = _SESSION.post(base_url, headers=headers, json=payload, timeout=timeout_sec)
         except Exception as e:
             return False, f"LLM request failed: {type(e).__name__}: {e}", None, 0, ""
 
@@ -135,7 +187,7 @@ def llm_exchange(user_text: str) -> Tuple[bool, str]:
             return False, f"LLM http={r.status_code} body={body}", None, r.status_code, body
 
         try:
-            j = r.json()
+            j = _json_loads(r.content)
         except Exception:
             return False, "LLM returned non-JSON response", None, r.status_code, ""
 
@@ -10,9 +10,11 @@ No long-running service here. This is pure utility.
 
 from __future__ import annotations
 
+import os
+import signal
 import subprocess
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple
 
 from voice_common import voice_log
 
@@ -20,6 +22,35 @@ BASE_DIR = Path("/home/pi/_RunScanner")
 TTS_SCRIPT = str(BASE_DIR / "av" / "tts_say.sh")
 
 
+def _run_group(cmd: List[str], timeout: float) -> Tuple[int, str]:
+    """
+    Run cmd in its own session; returns (returncode, stderr).
+    On timeout the whole process group (bash -> espeak/aplay, ...) is
+    terminated and reaped so nothing keeps the audio device busy.
+    """
+    with subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    ) as p:
+        try:
+            _, err = p.communicate(timeout=timeout)
+            return p.returncode, err or ""
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(p.pid, signal.SIGTERM)
+                p.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                os.killpg(p.pid, signal.SIGKILL)
+                p.wait()
+            except ProcessLookupError:
+                pass
+            raise
+
+
 def beep(duration_ms: int = 120, freq_hz: int = 880, volume: int = 30) -> Tuple[bool, str]:
     """
     Best-effort beep.
@@ -42,17 +73,10 @@ def beep(duration_ms: int = 120, freq_hz: int = 880, volume: int = 30) -> Tuple[
     ]
 
     try:
-        cp = subprocess.run(
-            cmd,
-            check=False,
-            capture_output=True,
-            text=True,
-            stdin=subprocess.DEVNULL,
-            timeout=5,
-        )
-        if cp.returncode == 0:
+        rc, err = _run_group(cmd, timeout=5)
+        if rc == 0:
             return True, f"beep ok dur_ms={duration_ms} freq={freq_hz} vol={vol}"
-        return False, f"beep rc={cp.returncode} stderr={(cp.stderr or '')[:120].strip()}"
+        return False, f"beep rc={rc} stderr={err[:120].strip()}"
     except FileNotFoundError:
         return False, "beep failed: /usr/bin/play not found (install sox package 'sox')"
     except Exception as e:
@@ -71,17 +95,11 @@ def say(text: str, lead_silence_ms: int = 300, volume: int = 90) -> Tuple[bool,
     vol = max(0, min(100, int(volume)))
 
     try:
-        cp = subprocess.run(
-            ["/usr/bin/bash", TTS_SCRIPT, t, str(lead), str(vol)],
-            check=False,
-            capture_output=True,
-            text=True,
-            stdin=subprocess.DEVNULL,
-            timeout=45,   # allow longer sentences
-        )
-        if cp.returncode == 0:
+        # allow longer sentences; on timeout the script and its players are killed
+        rc, err = _run_group(["/usr/bin/bash", TTS_SCRIPT, t, str(lead), str(vol)], timeout=45)
+        if rc == 0:
             return True, f"say ok text_len={len(t)} lead_ms={lead} vol={vol}"
-        return False, f"say rc={cp.returncode} stderr={(cp.stderr or '')[:200].strip()}"
+        return False, f"say rc={rc} stderr={err[:200].strip()}"
     except Exception as e:
         return False, f"say exception: {type(e).__name__}: {e}"
 
@@ -9,14 +9,19 @@ Real-time-ish STT loop (Wave-2)
 This is Step-1 only: building a reusable STT+matching engine.
 """
 
+import array
+import atexit
 import json
+import os
+import threading
 import time
 import wave
 import subprocess
+from collections import deque
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-from voice_common import fuzzy_match, normalize_text, match_wake_name
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from voice_common import WakeIndex, build_wake_index, fuzzy_match_many, normalize_text, match_wake_name
 
 # Reuse logging helpers if you have them
 try:
@@ -29,6 +34,25 @@ except Exception:
         if also_print:
             print(line, flush=True)
             
+# Optional fast JSON decode for Vosk results (falls back to stdlib)
+try:
+    import orjson  # type: ignore
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Optional multi-pattern matcher for the phrase fast path (falls back to a substring loop)
+try:
+    import ahocorasick  # type: ignore
+except ImportError:
+    ahocorasick = None
+
+# --- Optional WebRTC VAD (skip Vosk on silent chunks) ---
+try:
+    import webrtcvad  # type: ignore
+except Exception:
+    webrtcvad = None
+
 # --- Optional Vosk import guarded ---
 try:
     from vosk import Model, KaldiRecognizer  # type: ignore
@@ -37,7 +61,8 @@ except Exception:
     KaldiRecognizer = None
 
 
-CHUNK_WAV = Path("/tmp/voice_chunk.wav")
+# fallback chunk file: tmpfs if there is one (keeps per-chunk writes off the SD card)
+CHUNK_WAV = Path("/dev/shm/voice_chunk.wav") if Path("/dev/shm").is_dir() else Path("/tmp/voice_chunk.wav")
 
 
 @dataclass
@@ -115,6 +140,141 @@ def record_wav(out_wav: Path, mic_dev: str, rate: int, ch: int, dur_sec: int) ->
         return False, f"arecord exception: {type(e).__name__}: {e}"
 
 
+# Audio older than this is from while we were busy (speaking, LLM call):
+# drop it so the next chunk starts "now", like a fresh arecord would.
+MIC_STALE_SEC = 2.0     # gap between reads longer than this = paused (TTS etc.): drop old audio
+MIC_BUFFER_SEC = 10     # cap on audio held by the reader thread
+MIC_READ_BYTES = 4096   # 128 ms at 16 kHz mono
+
+
+class MicStream:
+    """
+    One long-lived arecord writing raw S16_LE PCM to a pipe.
+    Replaces an arecord fork + WAV file + re-read per chunk.
+    A reader thread keeps draining the pipe into a bounded buffer, so audio
+    spoken while the previous chunk is being decoded is not lost.
+    """
+
+    def __init__(self, mic_dev: str, rate: int, ch: int):
+        self.key = (mic_dev, rate, ch)
+        self.bytes_per_sec = rate * ch * 2
+        self.proc = subprocess.Popen(
+            [
+                "/usr/bin/arecord",
+                "-D", mic_dev,
+                "-f", "S16_LE",
+                "-r", str(rate),
+                "-c", str(ch),
+                "-t", "raw",
+                "-q",
+                "-",
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self.fd = self.proc.stdout.fileno()
+        self._cap = self.bytes_per_sec * MIC_BUFFER_SEC
+        self._blocks: Deque[bytes] = deque()
+        self._have = 0
+        self._eof = False
+        self._cv = threading.Condition()
+        self._last_read = time.monotonic()
+        self._thread = threading.Thread(target=self._reader, name="mic-reader", daemon=True)
+        self._thread.start()
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _reader(self) -> None:
+        fd, cv, blocks = self.fd, self._cv, self._blocks
+        while True:
+            try:
+                b = os.read(fd, MIC_READ_BYTES)
+            except OSError:
+                b = b""
+            with cv:
+                if not b:
+                    self._eof = True
+                    cv.notify_all()
+                    return
+                blocks.append(b)
+                self._have += len(b)
+                while self._have > self._cap:
+                    self._have -= len(blocks.popleft())
+                cv.notify_all()
+
+    def _drain(self) -> None:
+        self._blocks.clear()
+        self._have = 0
+
+    def read_sec(self, dur_sec: int) -> Tuple[bool, Any]:
+        """(True, pcm_bytes) for dur_sec of audio, or (False, reason)."""
+        want = int(self.bytes_per_sec * dur_sec)
+        with self._cv:
+            if time.monotonic() - self._last_read > MIC_STALE_SEC:
+                self._drain()
+            if not self._cv.wait_for(lambda: self._have >= want or self._eof, timeout=dur_sec + 3):
+                return False, "arecord stream stalled"
+            if self._have < want:
+                return False, f"arecord stream ended rc={self.proc.poll()}"
+
+            buf = bytearray()
+            while len(buf) < want:
+                b = self._blocks.popleft()
+                need = want - len(buf)
+                if len(b) > need:
+                    self._blocks.appendleft(b[need:])
+                    b = b[:need]
+                buf += b
+            self._have -= want
+            self._last_read = time.monotonic()
+        return True, bytes(buf)
+
+    def close(self) -> None:
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        except Exception:
+            pass
+        self._thread.join(timeout=2)  # reader sees EOF once arecord is gone
+        try:
+            self.proc.stdout.close()
+        except Exception:
+            pass
+
+
+_MIC: Optional[MicStream] = None
+
+
+def _mic_stream(mic_dev: str, rate: int, ch: int) -> Optional[MicStream]:
+    """Shared stream for (mic, rate, ch); restarted if it died or settings changed."""
+    global _MIC
+    if _MIC is not None and _MIC.key == (mic_dev, rate, ch) and _MIC.alive():
+        return _MIC
+    close_mic_stream()
+    try:
+        _MIC = MicStream(mic_dev, rate, ch)
+    except Exception:
+        _MIC = None
+    return _MIC
+
+
+def close_mic_stream() -> None:
+    """Release the mic (e.g. in deaf mode). No-op if no stream is open."""
+    global _MIC
+    if _MIC is not None:
+        _MIC.close()
+        _MIC = None
+
+
+atexit.register(close_mic_stream)
+
+
 # -------------------------
 # Vosk STT engine
 # -------------------------
@@ -125,101 +285,315 @@ class VoskSTT:
             raise RuntimeError("vosk not installed/importable")
         self.model = Model(str(model_dir))
         self.sample_rate = sample_rate
+        # One recognizer for the process: FinalResult() ends the utterance and
+        # leaves it ready for the next chunk, so no per-chunk decoder setup.
+        self.rec = KaldiRecognizer(self.model, sample_rate)
+        self.rec.SetWords(False)
+
+    def _reset(self) -> None:
+        """Drop any half-fed utterance (after an error)."""
+        try:
+            self.rec.Reset()
+        except Exception:
+            self.rec = KaldiRecognizer(self.model, self.sample_rate)
+
+    def _decode(self, frames: Iterator[bytes]) -> Tuple[bool, str]:
+        """
+        Feed audio slices to the shared recognizer; return the chunk's text.
+        Utterances that end mid-chunk (AcceptWaveform -> True) are collected
+        via Result() so they aren't dropped before FinalResult().
+        """
+        try:
+            rec = self.rec
+            parts: List[str] = []
+            for data in frames:
+                if rec.AcceptWaveform(data):
+                    t = (_json_loads(rec.Result() or "{}").get("text") or "").strip()
+                    if t:
+                        parts.append(t)
+            t = (_json_loads(rec.FinalResult() or "{}").get("text") or "").strip()
+            if t:
+                parts.append(t)
+            return True, " ".join(parts)
+        except Exception as e:
+            self._reset()
+            return False, f"vosk transcribe exception: {type(e).__name__}: {e}"
+
+    def transcribe_pcm(self, data: bytes) -> Tuple[bool, str]:
+        """Raw mono S16_LE PCM (from MicStream) -> text."""
+        step = self.sample_rate * 2  # 1 s per AcceptWaveform call, same slices as transcribe_wav
+        return self._decode(data[i:i + step] for i in range(0, len(data), step))
 
     def transcribe_wav(self, wav_path: Path) -> Tuple[bool, str]:
         try:
             wf = wave.open(str(wav_path), "rb")
+        except Exception as e:
+            return False, f"vosk transcribe exception: {type(e).__name__}: {e}"
+        with wf:
             if wf.getnchannels() != 1:
                 return False, "vosk expects mono wav"
-            rec = KaldiRecognizer(self.model, self.sample_rate)
+            return self._decode(iter(lambda: wf.readframes(self.sample_rate), b""))
 
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                rec.AcceptWaveform(data)
 
-            j = json.loads(rec.FinalResult() or "{}")
-            text = (j.get("text") or "").strip()
-            return True, text
-        except Exception as e:
-            return False, f"vosk transcribe exception: {type(e).__name__}: {e}"
+_STT_CACHE: Dict[Tuple[str, int], VoskSTT] = {}  # (model_dir, rate) -> loaded engine
 
 
-def init_vosk(cfg: Dict[str, Any]) -> Tuple[Optional[VoskSTT], str]:
-    model_dir = (cfg.get("vosk_model_dir") or "").strip()
+def init_vosk(cfg: Dict[str, Any], *, model_key: str = "vosk_model_dir") -> Tuple[Optional[VoskSTT], str]:
+    """
+    Load (once per process) the Vosk model named by cfg[model_key]. Repeated
+    calls, e.g. one per run_rt_match_loop(), reuse the already-loaded model.
+    """
+    model_dir = (cfg.get(model_key) or "").strip()
     if not model_dir:
-        return None, "vosk_model_dir missing"
+        return None, f"{model_key} missing"
+    rate = int(cfg.get("sample_rate") or 16000)
+    cached = _STT_CACHE.get((model_dir, rate))
+    if cached is not None:
+        return cached, "vosk ready"
     p = Path(model_dir)
     if not p.exists():
         return None, f"vosk model not found: {model_dir}"
     try:
-        stt = VoskSTT(p, int(cfg.get("sample_rate") or 16000))
+        stt = VoskSTT(p, rate)
+        _STT_CACHE[(model_dir, rate)] = stt
         return stt, "vosk ready"
     except Exception as e:
         return None, f"vosk init failed: {type(e).__name__}: {e}"
 
+
+def init_wake_vosk(cfg: Dict[str, Any], full: Optional[VoskSTT]) -> Tuple[Optional[VoskSTT], str]:
+    """
+    STT for wake-name listening. With cfg wake_model_dir set (a smaller
+    Vosk model), name_listen decodes with that and only conversation pays
+    for the full model; otherwise (or if it fails to load) use full.
+    """
+    if not (cfg.get("wake_model_dir") or "").strip():
+        return full, "full model"
+    stt, detail = init_vosk(cfg, model_key="wake_model_dir")
+    if stt is None:
+        return full, f"full model (wake: {detail})"
+    return stt, "wake model"
+
+
+def prewarm_vosk_model(cfg: Dict[str, Any]) -> Tuple[bool, str]:
+    """
+    Ask the kernel to start reading the model files into the page cache
+    (POSIX_FADV_WILLNEED, non-blocking), so a later init_vosk() loads from
+    RAM instead of the SD card. Best-effort.
+    """
+    dirs = [d for d in ((cfg.get(k) or "").strip() for k in ("wake_model_dir", "vosk_model_dir")) if d]
+    if not dirs or not hasattr(os, "posix_fadvise"):
+        return False, "skip"
+    n = 0
+    try:
+        for root, _dirs, files in (w for d in dirs for w in os.walk(d)):
+            for name in files:
+                try:
+                    fd = os.open(os.path.join(root, name), os.O_RDONLY)
+                except OSError:
+                    continue
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                    n += 1
+                except OSError:
+                    pass
+                finally:
+                    os.close(fd)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+    return True, f"files={n}"
+
+# -------------------------
+# Voice activity gate
+# -------------------------
+VAD_FRAME_MS = 30
+VAD_RATES = (8000, 16000, 32000, 48000)  # what webrtcvad accepts
+
+_VAD: Optional[Tuple[int, Any]] = None  # (aggressiveness, webrtcvad.Vad)
+
+
+def _vad(mode: int) -> Any:
+    global _VAD
+    if _VAD is None or _VAD[0] != mode:
+        _VAD = (mode, webrtcvad.Vad(mode))
+    return _VAD[1]
+
+
+def chunk_has_speech(cfg: Dict[str, Any], pcm: bytes, rate: int) -> bool:
+    """
+    True if the mono S16_LE chunk holds at least vad_min_speech_frames
+    30 ms speech frames. Opt-in (cfg "vad": true); always True when VAD is
+    off/unavailable, so the chunk is decoded as before.
+    """
+    if webrtcvad is None or not cfg.get("vad", False) or rate not in VAD_RATES:
+        return True
+    try:
+        vad = _vad(min(3, max(0, int(cfg.get("vad_mode", 2)))))
+        need = max(1, int(cfg.get("vad_min_speech_frames", 5)))
+        step = rate * VAD_FRAME_MS // 1000 * 2
+        mv = memoryview(pcm)
+        hits = 0
+        for i in range(0, len(pcm) - step + 1, step):
+            if vad.is_speech(mv[i:i + step].tobytes(), rate):
+                hits += 1
+                if hits >= need:
+                    return True
+        return False
+    except Exception:
+        return True
+
 # -------------------------
 # Matching
 # -------------------------
 # voice_rt_stt.py
 
-def match_robot_name(text_norm: str, robot_names: List[str]) -> Optional[str]:
+# Lowest cutoff fuzzy_match can apply to a phrase's last (mandatory) token:
+# first_token_cutoff for one-word phrases, last_token_cutoff otherwise.
+PHRASE_LAST_TOKEN_MIN_RATIO = 0.85
+
+@dataclass(frozen=True)
+class PhraseIndex:
+    raw: str                  # phrase as configured (returned on match)
+    norm: str                 # normalize_text(raw)
+    tokens: frozenset         # set of norm words (for cheap prefilters)
+
+
+def build_phrase_index(phrases: List[str]) -> List[PhraseIndex]:
+    out: List[PhraseIndex] = []
+    for ph in phrases:
+        n = normalize_text(ph)
+        out.append(PhraseIndex(raw=ph, norm=n, tokens=frozenset(n.split())))
+    return out
+
+
+@dataclass
+class RtMatcher:
+    """
+    Per-loop matcher with all target normalization done up front, so each
+    STT chunk only runs the scoring calls. Build with compile_matcher().
+    """
+    kind: str                                 # "name" or "phrase"
+    names: List[Tuple[str, WakeIndex]]        # (robot_name, callsign wake index)
+    phrases: List[PhraseIndex]
+    automaton: Any = None                     # pyahocorasick over phrase norms (optional)
+
+    def match(self, text_norm: str) -> Optional[str]:
+        if self.kind == "name":
+            for rn, wake_index in self.names:
+                ok, _why = match_wake_name(text_norm, wake_index=wake_index)
+                if ok:
+                    return rn
+            return None
+        return self._match_phrase(text_norm)
+
+    def _match_phrase(self, text_norm: str) -> Optional[str]:
+        if not text_norm:
+            return None
+
+        # 1) Fast path: strict substring (first phrase in script order wins)
+        if self.automaton is not None:
+            hits = [i for _end, i in self.automaton.iter(text_norm)]
+            if hits:
+                return self.phrases[min(hits)].raw
+        else:
+            for p in self.phrases:
+                if p.norm and p.norm in text_norm:
+                    return p.raw
+
+        # 2) Fuzzy path: all phrases scored in one batch; the last (discriminating)
+        #    word must match strongly, any other word counts as extra support
+        best_phrase: Optional[str] = None
+        best_score: float = 0.0
+
+        cands = _phrase_candidates(text_norm, self.phrases)
+        if not cands:
+            return None
+        results = fuzzy_match_many(text_norm, [p.norm for p in cands], min_hit=1)
+        for p, (ok, score) in zip(cands, results):
+            if ok and score > best_score:
+                best_score = score
+                best_phrase = p.raw
+
+        return best_phrase
+
+def _phrase_candidates(text_norm: str, phrases: List[PhraseIndex]) -> List[PhraseIndex]:
+    """
+    Drop phrases whose last word cannot reach the fuzzy cutoff against any
+    heard word. ratio(a, b) <= 2*min(len)/(len(a)+len(b)), so this is a
+    length check only and never drops a phrase fuzzy_match would accept.
+    """
+    heard = text_norm.split()
+    heard_set = frozenset(heard)
+    heard_lens = {len(w) for w in heard}
+    out: List[PhraseIndex] = []
+    for p in phrases:
+        if not p.tokens:
+            continue
+        last = p.norm.rsplit(" ", 1)[-1]
+        if last in heard_set:
+            out.append(p)
+            continue
+        L = len(last)
+        for h in heard_lens:
+            if 2 * min(L, h) / (L + h) >= PHRASE_LAST_TOKEN_MIN_RATIO:
+                out.append(p)
+                break
+    return out
+
+def _build_automaton(index: List[PhraseIndex]) -> Any:
+    """One pass over the text finds every phrase; None without pyahocorasick."""
+    if ahocorasick is None or not any(p.norm for p in index):
+        return None
+    A = ahocorasick.Automaton()
+    for i, p in enumerate(index):
+        if p.norm and p.norm not in A:
+            A.add_word(p.norm, i)  # duplicate phrase: keep the first index
+    A.make_automaton()
+    return A
+
+def compile_matcher(
+    kind: str,
+    robot_names: Optional[List[str]] = None,
+    phrases: Optional[List[str]] = None,
+) -> RtMatcher:
     """
     robot_names here should be [ident] for NAME_LISTEN.
-    ident format: "twin-scout-alpha" etc.
+    ident format: "twin-scout-alpha" etc.; the callsign is its last word.
     """
-    for rn in robot_names:
-        rn_norm = normalize_text(rn)
-        parts = rn_norm.split()
+    names: List[Tuple[str, WakeIndex]] = []
+    for rn in robot_names or []:
+        parts = normalize_text(rn).split()
         # Expect: ["twin","scout","alpha"] but be defensive
-        if not parts:
-            continue
-        callsign = parts[-1]  # last word: alpha/bravo/...
-        ok, _why = match_wake_name(text_norm, callsign=callsign)
-        if ok:
-            return rn
-    return None
+        if parts:
+            names.append((rn, build_wake_index(parts[-1])))  # last word: alpha/bravo/...
+    index = build_phrase_index(phrases or [])
+    return RtMatcher(kind=kind, names=names, phrases=index, automaton=_build_automaton(index))
+
+def match_robot_name(text_norm: str, robot_names: List[str]) -> Optional[str]:
+    """One-off name match (loops should reuse a compile_matcher() result)."""
+    return compile_matcher("name", robot_names=robot_names).match(text_norm)
 
 def match_phrase(text_norm: str, phrases: List[str]) -> Optional[str]:
     """
     Fuzzy phrase match.
-    For phrases, we usually want a bit stricter ratio than wake-name.
+    One-off; loops should reuse a compile_matcher() result.
     """
-    if not text_norm:
-        return None
-
-    # 1) Fast path: strict substring
-    for ph in phrases:
-        ph_norm = normalize_text(ph)
-        if ph_norm and ph_norm in text_norm:
-            return ph
-
-    # 2) Fuzzy path
-    best_phrase: Optional[str] = None
-    best_score: float = 0.0
-
-    for ph in phrases:
-        ok, dbg = fuzzy_match(
-            ph,
-            text_norm,
-            min_token_overlap=0.50,
-            min_ratio=0.65,   # a bit stricter for longer phrases
-        )
-        score = float(dbg.get("ratio", 0.0)) if isinstance(dbg, dict) else 0.0
-        if ok and score > best_score:
-            best_score = score
-            best_phrase = ph
-
-    return best_phrase
+    return compile_matcher("phrase", phrases=phrases).match(text_norm)
 
 # -------------------------
 # Real-time-ish loop
 # -------------------------
 
+def _first_channel(pcm: bytes, ch: int) -> bytes:
+    """Interleaved S16_LE with ch channels -> mono (channel 0)."""
+    a = array.array("h")
+    a.frombytes(pcm[: len(pcm) - len(pcm) % (2 * ch)])
+    return a[::ch].tobytes()
+
+
 def stt_loop_once(cfg: Dict[str, Any], stt: VoskSTT) -> Tuple[bool, str, str]:
     """
-    Record one chunk and transcribe.
+    Record one chunk (from the persistent mic stream) and transcribe.
     Returns (ok, raw_text, norm_text)
     """
     mic = (cfg.get("mic_dev") or "plughw:1,0")
@@ -227,11 +601,23 @@ def stt_loop_once(cfg: Dict[str, Any], stt: VoskSTT) -> Tuple[bool, str, str]:
     ch = int(cfg.get("channels") or 1)
     dur = int(cfg.get("chunk_sec") or 3)
 
-    ok, detail = record_wav(CHUNK_WAV, mic, rate, ch, dur)
-    if not ok:
-        return False, detail, ""
-
-    ok2, raw = stt.transcribe_wav(CHUNK_WAV)
+    stream = _mic_stream(mic, rate, ch)
+    if stream is not None:
+        ok, data = stream.read_sec(dur)
+        if not ok:
+            close_mic_stream()  # restarted on the next call
+            return False, data, ""
+        if ch > 1:
+            data = _first_channel(data, ch)  # Vosk wants mono
+        if not chunk_has_speech(cfg, data, rate):
+            return True, "", ""  # silence: same result Vosk would give, without the decode
+        ok2, raw = stt.transcribe_pcm(data)
+    else:
+        # fallback (stream could not start): one arecord + WAV file per chunk
+        ok, detail = record_wav(CHUNK_WAV, mic, rate, ch, dur)
+        if not ok:
+            return False, detail, ""
+        ok2, raw = stt.transcribe_wav(CHUNK_WAV)
     if not ok2:
         return False, raw, ""
 
@@ -259,13 +645,17 @@ def run_rt_match_loop(
       - max_sec elapsed
       - fatal error (e.g. vosk not available)
     """
+    if kind not in ("name", "phrase"):
+        return False, None, f"unknown kind={kind}"
+
     stt, detail = init_vosk(cfg)
     if stt is None:
         return False, None, detail
+    if kind == "name":
+        stt, _ = init_wake_vosk(cfg, stt)
 
     t0 = time.time()
-    robot_names = robot_names or []
-    phrases = phrases or []
+    matcher = compile_matcher(kind, robot_names=robot_names, phrases=phrases)
 
     voice_log(f"RT_STT: start kind={kind} max_sec={max_sec}")
 
@@ -286,20 +676,11 @@ def run_rt_match_loop(
 
         voice_log(f"RT_STT: heard raw='{raw}' norm='{norm}'")
 
+        m = matcher.match(norm)
         if kind == "name":
-            m = match_robot_name(norm, robot_names)
             voice_log(f"RT_STT: NAME matched='{m}' from norm='{norm}'")
-            if m:
-                ev = MatchEvent(kind="name", text_raw=raw, text_norm=norm, matched=m)
-                return True, ev, "matched"
-
-        elif kind == "phrase":
-            m = match_phrase(norm, phrases)
-            if m:
-                ev = MatchEvent(kind="phrase", text_raw=raw, text_norm=norm, matched=m)
-                return True, ev, "matched"
-
-        else:
-            return False, None, f"unknown kind={kind}"
+        if m:
+            ev = MatchEvent(kind=kind, text_raw=raw, text_norm=norm, matched=m)
+            return True, ev, "matched"
 
         time.sleep(idle_sleep_ms / 1000.0)
@@ -22,9 +22,12 @@ Wave-2:
 
 from __future__ import annotations
 
+import os
+import signal
 import time
 import subprocess
-from typing import Dict, Any, Tuple
+from dataclasses import dataclass
+from typing import Dict, Any, List, Tuple
 from voice_common import (
     read_identity,
     load_voice_config,
@@ -32,14 +35,55 @@ from voice_common import (
     voice_log,
     normalize_text,
     match_wake_name,
+    build_wake_index,
+    compile_script,
+    wait_voice_config_change,
 )
-from voice_rt_stt import init_vosk, stt_loop_once
+from voice_rt_stt import close_mic_stream, init_vosk, init_wake_vosk, prewarm_vosk_model, stt_loop_once
 from voice_llm import llm_exchange
 
+# Optional: read unit state over D-Bus (no fork+exec); systemctl is the fallback
+try:
+    from pystemd.systemd1 import Unit as _SdUnit  # type: ignore
+except Exception:
+    _SdUnit = None
+
 HEARTBEAT_SEC = 10
-IDLE_SLEEP_SEC = 0.05
 
 TTS_SCRIPT = "/home/pi/_RunScanner/av/tts_say.sh"
+# (text, lead, vol, rate, amp) -> mpv argv printed by tts_say.sh (TTS_PRINT_CMD=1);
+# the script owns the cache key/dir and the mpv arguments, we only replay them
+_TTS_PLAY_CMDS: Dict[Tuple[str, int, int, int, int], List[str]] = {}
+TTS_PLAY_CMDS_MAX = 64
+
+def _tts_play_cmd(text: str, lead_ms: int, vol: int, rate: int, amp: int) -> List[str] | None:
+    """mpv argv for a phrase tts_say.sh has cached; None if the script can't provide one."""
+    key = (text, lead_ms, vol, rate, amp)
+    cmd = _TTS_PLAY_CMDS.get(key)
+    if cmd is not None:
+        try:
+            os.utime(cmd[-1])  # keep it recent for the script's LRU pruning
+            return cmd
+        except OSError:
+            _TTS_PLAY_CMDS.pop(key, None)  # pruned by the script; ask again
+    try:
+        cp = subprocess.run(
+            ["/usr/bin/bash", TTS_SCRIPT, text, str(lead_ms), str(vol), str(rate), str(amp)],
+            check=False,
+            capture_output=True,
+            stdin=subprocess.DEVNULL,
+            env={**os.environ, "TTS_PRINT_CMD": "1"},
+            timeout=30,
+        )
+    except Exception:
+        return None
+    cmd = [a.decode("utf-8", "surrogateescape") for a in cp.stdout.split(b"\0") if a]
+    if cp.returncode != 0 or len(cmd) < 2:
+        return None
+    if len(_TTS_PLAY_CMDS) >= TTS_PLAY_CMDS_MAX:
+        _TTS_PLAY_CMDS.clear()
+    _TTS_PLAY_CMDS[key] = cmd
+    return cmd
 
 def _cfg_int(cfg: Dict[str, Any], key: str, default: int) -> int:
     try:
@@ -55,6 +99,30 @@ def _cfg_str(cfg: Dict[str, Any], key: str, default: str = "") -> str:
     s = cfg.get(key, default)
     return str(s).strip()
 
+@dataclass(frozen=True)
+class RuntimeCfg:
+    easy: bool            # test_easy_match
+    min_chars: int        # test_min_chars in easy mode, else 3
+    wake_always: bool     # test_wake_always (only honoured when easy)
+    phrase_always: bool   # test_phrase_always (only honoured when easy)
+    conv_to: int          # conversation_timeout_sec
+    llm_to: int           # llm_timeout_sec
+
+def _runtime_cfg(cfg: Dict[str, Any]) -> RuntimeCfg:
+    """
+    Values the main loop branches on, coerced once per loop iteration
+    instead of per branch. Bad numbers fall back to the defaults.
+    """
+    easy = _cfg_bool(cfg, "test_easy_match", False)
+    return RuntimeCfg(
+        easy=easy,
+        min_chars=_cfg_int(cfg, "test_min_chars", 1) if easy else 3,
+        wake_always=_cfg_bool(cfg, "test_wake_always", False),
+        phrase_always=_cfg_bool(cfg, "test_phrase_always", False),
+        conv_to=_cfg_int(cfg, "conversation_timeout_sec", 20) or 20,
+        llm_to=_cfg_int(cfg, "llm_timeout_sec", 30) or 30,
+    )
+
 def _speak_cfg(cfg: Dict[str, Any], text: str, *, lead_ms: int = 600) -> Tuple[bool, str]:
     vol  = _cfg_int(cfg, "tts_volume", 120)   # mpv gain
     rate = _cfg_int(cfg, "tts_rate", 135)     # espeak speed
@@ -90,7 +158,7 @@ def _enter_mode(cfg: Dict[str, Any], new_mode: str, *, reason: str = "") -> Tupl
         ok, detail = _speak_cfg(cfg, prompt, lead_ms=300 if new_mode != "deaf" else 600)
         voice_log(f"VOICE: enter_say mode={new_mode} ok={ok} detail={detail} reason={reason}")
 
-    return new_mode, time.time()
+    return new_mode, time.monotonic()
 
 def _sanitize_mode(mode: str) -> str:
     m = (mode or "").strip()
@@ -122,6 +190,24 @@ def _speak(
     if not text:
         return True, "skip empty"
 
+    # Replay the script's mpv command directly: a repeated prompt costs one
+    # mpv exec instead of bash + sha1sum + mpv
+    cmd = _tts_play_cmd(text, int(lead_ms), int(vol), int(rate), int(amp))
+    if cmd is not None:
+        try:
+            cp = subprocess.run(
+                cmd,
+                check=False,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=30,
+            )
+            if cp.returncode == 0:
+                return True, f"ok text_len={len(text)} cached"
+        except Exception:
+            pass  # fall through to the script
+
     try:
         cp = subprocess.run(
             [
@@ -145,12 +231,32 @@ def _speak(
     except Exception as e:
         return False, f"exception {type(e).__name__}: {e}"
 
-def _run_status_summary() -> str:
+_SD_UNITS: Dict[str, Any] = {}                  # unit name -> loaded pystemd Unit
+_UNIT_STATE_CACHE: Dict[str, Tuple[float, str]] = {}  # unit -> (monotonic ts, state)
+UNIT_STATE_TTL_SEC = 2.0
+
+def _unit_active_state(unit: str) -> str:
     """
-    Very lightweight health summary for Wave-2.
-    Keep it short so TTS is clear.
+    'active' / 'inactive' / ... for unit; 'unknown' on error.
+    D-Bus (pystemd) first, then systemctl is-active; cached UNIT_STATE_TTL_SEC.
     """
-    def _is_active(unit: str) -> str:
+    now = time.monotonic()
+    hit = _UNIT_STATE_CACHE.get(unit)
+    if hit is not None and now - hit[0] < UNIT_STATE_TTL_SEC:
+        return hit[1]
+
+    state = ""
+    if _SdUnit is not None:
+        try:
+            u = _SD_UNITS.get(unit)
+            if u is None:
+                u = _SdUnit(unit.encode("utf-8"))
+                u.load()
+                _SD_UNITS[unit] = u
+            state = u.Unit.ActiveState.decode("utf-8", "replace")
+        except Exception:
+            state = ""
+    if not state:
         try:
             cp = subprocess.run(
                 ["/bin/systemctl", "is-active", unit],
@@ -160,35 +266,40 @@ def _run_status_summary() -> str:
                 stdin=subprocess.DEVNULL,
                 timeout=3,
             )
-            s = (cp.stdout or "").strip()
-            return s if s else "unknown"
+            state = (cp.stdout or "").strip()
         except Exception:
-            return "unknown"
+            state = ""
+    state = state or "unknown"
+    _UNIT_STATE_CACHE[unit] = (now, state)
+    return state
 
-    agent = _is_active("scanner-agent.service")
-    voice = _is_active("scanner-voice.service")
+def _run_status_summary() -> str:
+    """
+    Very lightweight health summary for Wave-2.
+    Keep it short so TTS is clear.
+    """
+    agent = _unit_active_state("scanner-agent.service")
+    voice = _unit_active_state("scanner-voice.service")
 
     # Keep it short:
     if agent == "active" and voice == "active":
         return "All systems look normal."
     return f"Agent is {agent}. Voice is {voice}."
 
-def _phrase_match(cfg: Dict[str, Any], norm_text: str, phrase: str) -> bool:
+def _phrase_match(rt: RuntimeCfg, norm_text: str, phrase_norm: str) -> bool:
     """
-    Wave-2 phrase match.
+    Wave-2 phrase match (phrase_norm from compile_script).
     Test mode: if test_phrase_always is true, any non-trivial speech counts as match.
     """
-    test_easy = _cfg_bool(cfg, "test_easy_match", False)
-    min_chars = _cfg_int(cfg, "test_min_chars", 1) if test_easy else 3
-    if test_easy and _cfg_bool(cfg, "test_phrase_always", False):
-        return len(norm_text) >= min_chars
+    if rt.easy and rt.phrase_always:
+        return len(norm_text) >= rt.min_chars
 
-    p = normalize_text(phrase)
-    return bool(p) and p in norm_text
+    return bool(phrase_norm) and phrase_norm in norm_text
 
 def main() -> None:
     ident = read_identity() or "UNKNOWN"
     callsign = _callsign_from_identity(ident)
+    wake_index = build_wake_index(callsign)
     voice_log(f"VOICE: service start identity='{ident}' callsign='{callsign}'")
     cfg0 = load_voice_config()
     voice_log(
@@ -204,21 +315,27 @@ def main() -> None:
     cfg["mode"] = _sanitize_mode(cfg.get("mode", "deaf"))
     save_voice_config(cfg)
 
-    # Vosk init (lazy but cached)
+    # Vosk init (lazy but cached); start paging the model in now so the
+    # first non-deaf chunk doesn't wait on the SD card
     stt = None
     stt_detail = "not initialized"
+    wake_stt = None
+    wake_key = None  # wake_model_dir wake_stt was resolved for
+    ok, detail = prewarm_vosk_model(cfg)
+    voice_log(f"VOICE: vosk prewarm ok={ok} detail={detail}")
 
     # State tracking
     mode = cfg["mode"]
     last_mode = None
-    mode_enter_ts = time.time()
-    last_hb = 0.0
+    mode_enter_ts = time.monotonic()
+    last_hb = float("-inf")  # heartbeat on the first pass (monotonic clock can be < HEARTBEAT_SEC at boot)
     conv_last_activity_ts = mode_enter_ts
     llm_last_activity_ts = mode_enter_ts
 
     while True:
         try:
             cfg = load_voice_config()
+            rt = _runtime_cfg(cfg)
 
             # --- External requested mode (restricted to deaf <-> name_listen) ---
             requested = _sanitize_mode(cfg.get("mode", "deaf"))
@@ -234,12 +351,12 @@ def main() -> None:
                 voice_log(f"VOICE: mode -> {mode}")
                 last_mode = mode
                 if mode == "conversation":
-                    conv_last_activity_ts = time.time()
+                    conv_last_activity_ts = time.monotonic()
                 elif mode == "llm_dummy":
-                    llm_last_activity_ts = time.time()
+                    llm_last_activity_ts = time.monotonic()
 
             # --- Heartbeat ---
-            now = time.time()
+            now = time.monotonic()
             if now - last_hb >= HEARTBEAT_SEC:
                 voice_log(
                     f"VOICE: heartbeat mode={mode} script_len={len(cfg.get('script') or [])} "
@@ -250,7 +367,9 @@ def main() -> None:
 
             # --- Mode behavior ---
             if mode == "deaf":
-                time.sleep(0.5)
+                close_mic_stream()  # don't hold the mic while deaf
+                # sleep until the config is rewritten (mode flip) or the next heartbeat is due
+                wait_voice_config_change(max(0.05, HEARTBEAT_SEC - (time.monotonic() - last_hb)))
                 continue
 
             # init vosk once when needed
@@ -267,18 +386,18 @@ def main() -> None:
 
             # NAME_LISTEN: listen for wake name -> enter conversation
             if mode == "name_listen":
-                ok, raw, norm = stt_loop_once(cfg, stt)
+                key = (cfg.get("wake_model_dir") or "").strip()
+                if wake_stt is None or key != wake_key:
+                    wake_stt, detail = init_wake_vosk(cfg, stt)
+                    wake_key = key
+                    voice_log(f"VOICE: name_listen STT = {detail}")
+                ok, raw, norm = stt_loop_once(cfg, wake_stt)
                 if ok:
-                    norm = normalize_text(norm)
-
-                    test_easy = _cfg_bool(cfg, "test_easy_match", False)
-                    min_chars = _cfg_int(cfg, "test_min_chars", 1) if test_easy else 3
-
-                    if test_easy and _cfg_bool(cfg, "test_wake_always", False):
-                        matched = (len(norm) >= min_chars)
-                        why = f"test_wake_always(min_chars={min_chars})"
+                    if rt.easy and rt.wake_always:
+                        matched = (len(norm) >= rt.min_chars)
+                        why = f"test_wake_always(min_chars={rt.min_chars})"
                     else:
-                        matched, why = match_wake_name(norm, callsign=callsign)
+                        matched, why = match_wake_name(norm, wake_index=wake_index)
 
                     voice_log(f"RT_STT: heard raw='{raw}' norm='{norm}' wake={matched} why={why}")
 
@@ -289,54 +408,40 @@ def main() -> None:
                     voice_log(f"RT_STT: chunk error: {raw}")
                     time.sleep(0.2)
 
-                time.sleep(IDLE_SLEEP_SEC)
                 continue
 
             # CONVERSATION: match scripted phrases; timeout -> name_listen
             if mode == "conversation":
-                conv_to = int(cfg.get("conversation_timeout_sec") or 20)
-                if (time.time() - conv_last_activity_ts) >= conv_to:
+                if (time.monotonic() - conv_last_activity_ts) >= rt.conv_to:
                     voice_log("VOICE: conversation timeout -> name_listen")
                     mode, mode_enter_ts = _enter_mode(cfg, "name_listen", reason="conversation_timeout")
                     continue                    
 
                 ok, raw, norm = stt_loop_once(cfg, stt)
                 if ok:
-                    norm = normalize_text(norm)
                     voice_log(f"RT_STT: heard raw='{raw}' norm='{norm}'")
                     # any usable speech keeps conversation alive
-                    test_easy = _cfg_bool(cfg, "test_easy_match", False)
-                    min_chars = _cfg_int(cfg, "test_min_chars", 1) if test_easy else 3
-                    if len(norm) >= min_chars:
-                        conv_last_activity_ts = time.time()
+                    if len(norm) >= rt.min_chars:
+                        conv_last_activity_ts = time.monotonic()
 
-                    script = cfg.get("script") or []
+                    script = compile_script(cfg.get("script"))
 
                     # Test helper: if phrase_always is enabled and script has entries,
                     # treat ONLY the first script entry as matched when we have any speech.
-                    test_easy = _cfg_bool(cfg, "test_easy_match", False)
-                    phrase_always = _cfg_bool(cfg, "test_phrase_always", False)
-                    min_chars = _cfg_int(cfg, "test_min_chars", 1) if test_easy else 3
+                    phrase_always = rt.easy and rt.phrase_always
 
-                    if test_easy and phrase_always and script:
+                    if phrase_always and script:
                         script = [script[0]]
 
-                    for item in script:
-                        phrase = str(item.get("phrase") or "").strip()
-                        reply  = str(item.get("reply") or "").strip()
-                        action = str(item.get("action") or "").strip()
-
-                        if not phrase:
-                            continue
-
+                    for phrase, phrase_norm, reply, action in script:
                         # Decide hit
-                        if len(norm) < min_chars:
+                        if len(norm) < rt.min_chars:
                             continue
 
-                        if test_easy and phrase_always:
+                        if phrase_always:
                             hit = True
                         else:
-                            hit = _phrase_match(cfg, norm, phrase)   # <-- correct signature
+                            hit = _phrase_match(rt, norm, phrase_norm)
 
                         if not hit:
                             continue
@@ -361,31 +466,25 @@ def main() -> None:
                     voice_log(f"RT_STT: chunk error: {raw}")
                     time.sleep(0.2)
 
-                time.sleep(IDLE_SLEEP_SEC)
                 continue
 
             # LLM_DUMMY (Wave-3): STT -> LLM -> TTS; timeout -> name_listen
             if mode == "llm_dummy":
-                llm_to = int(cfg.get("llm_timeout_sec") or 30)
 
                 # timeout based on last activity (NOT entry time)
-                if (time.time() - llm_last_activity_ts) >= llm_to:
+                if (time.monotonic() - llm_last_activity_ts) >= rt.llm_to:
                     voice_log("VOICE: llm timeout -> name_listen")
                     mode, mode_enter_ts = _enter_mode(cfg, "name_listen", reason="llm_timeout")
                     continue
 
                 ok, raw, norm = stt_loop_once(cfg, stt)
                 if ok:
-                    norm = normalize_text(norm)
                     voice_log(f"RT_STT: heard raw='{raw}' norm='{norm}' (llm_dummy)")
 
                     # Consider "activity" only when norm has enough chars
-                    test_easy = _cfg_bool(cfg, "test_easy_match", False)
-                    min_chars = _cfg_int(cfg, "test_min_chars", 1) if test_easy else 3
-
-                    if len(norm) >= min_chars:
+                    if len(norm) >= rt.min_chars:
                         # user activity keeps LLM session alive
-                        llm_last_activity_ts = time.time()
+                        llm_last_activity_ts = time.monotonic()
 
                         # Send to LLM
                         ok2, reply_or_err = llm_exchange(norm)
@@ -393,17 +492,16 @@ def main() -> None:
                             if reply_or_err.strip():
                                 _speak_cfg(cfg, reply_or_err.strip(), lead_ms=250)
                                 # assistant activity also keeps LLM session alive
-                                llm_last_activity_ts = time.time()
+                                llm_last_activity_ts = time.monotonic()
                         else:
                             voice_log(f"LLM: error {reply_or_err}")
                             _speak_cfg(cfg, "Sorry, I cannot reach the server right now.", lead_ms=250)
-                            llm_last_activity_ts = time.time()
+                            llm_last_activity_ts = time.monotonic()
 
                 else:
                     voice_log(f"RT_STT: chunk error: {raw}")
                     time.sleep(0.2)
 
-                time.sleep(IDLE_SLEEP_SEC)
                 continue
 
             # Unknown -> safety
@@ -421,7 +519,14 @@ def main() -> None:
             time.sleep(0.5)
 
 
+def _on_sigterm(signum: int, frame: Any) -> None:
+    # systemctl stop: exit through SystemExit so atexit drains the queued voice_log
+    voice_log("VOICE: SIGTERM -> service stop")
+    raise SystemExit(0)
+
+
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _on_sigterm)
     try:
         main()
     except KeyboardInterrupt: